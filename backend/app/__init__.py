@@ -1,9 +1,8 @@
 from flask import Flask
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 import os
 
-db = SQLAlchemy()
+from .database import db, upgrade_schema
 
 def create_app():
     app = Flask(__name__)
@@ -12,21 +11,28 @@ def create_app():
     CORS(app)
     
     # Configure SQLite database
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///fake_news_detector.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///fake_news_detector.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
     # Initialize extensions
     db.init_app(app)
     
+    # Prometheus metrics at /metrics
+    from .metrics import init_metrics
+    init_metrics(app)
+    
     # Register blueprints
     from .routes.image import image_bp
     from .routes.admin import admin_bp
+    from .routes.profiles import profiles_bp
     
     app.register_blueprint(image_bp, url_prefix='/api/image')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(profiles_bp, url_prefix='/api/profiles')
     
     # Create database tables
     with app.app_context():
         db.create_all()
+        upgrade_schema()
     
     return app
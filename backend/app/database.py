@@ -0,0 +1,37 @@
+"""SQLAlchemy instance shared by the app factory and the models."""
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
+
+db = SQLAlchemy()
+
+# Indexes replaced by wider ones under new names, dropped by upgrade_schema
+SUPERSEDED_INDEXES = {
+    'training_data': ['ix_training_data_label', 'ix_training_data_created_at'],
+}
+
+def upgrade_schema():
+    """Add columns and indexes introduced after a table was first created.
+
+    `db.create_all` only creates missing tables, so existing databases are
+    brought up to date here; indexes in SUPERSEDED_INDEXES are dropped.
+    Must be called inside an app context.
+    """
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        with db.engine.begin() as connection:
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    connection.execute(text(
+                        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                    ))
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        with db.engine.begin() as connection:
+            for name in SUPERSEDED_INDEXES.get(table.name, []):
+                if name in indexes:
+                    connection.execute(text(f'DROP INDEX {name}'))
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
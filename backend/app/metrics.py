@@ -0,0 +1,110 @@
+"""Prometheus metrics for the Flask backend, served at /metrics.
+
+Stage histograms show where /api/image/analyze spends its time:
+
+    fetch       downloading an image URL
+    decode      decoding the image to RGB
+    preprocess  resizing the image
+    features    feature extraction
+    model       the random forest prediction
+    metadata    EXIF and image info extraction
+
+Under gunicorn with several workers, set PROMETHEUS_MULTIPROC_DIR to an
+empty directory so /metrics aggregates all worker processes.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+
+# Same names as the ML service's stages where the work matches: decode to
+# RGB, then resize ("preprocess"); feature extraction has its own stage
+STAGES = ("fetch", "decode", "preprocess", "features", "model", "metadata")
+
+# Sub-millisecond feature extraction up to slow downloads
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = Histogram(
+    "backend_stage_duration_seconds", "Time spent in each pipeline stage",
+    ["stage"], buckets=STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "backend_request_duration_seconds", "HTTP request latency by endpoint",
+    ["endpoint"], buckets=STAGE_BUCKETS
+)
+REQUESTS = Counter(
+    "backend_requests_total", "HTTP requests by endpoint and outcome",
+    ["endpoint", "outcome"]
+)
+IN_FLIGHT = Gauge(
+    "backend_requests_in_flight", "HTTP requests currently being handled",
+    multiprocess_mode="livesum"
+)
+MODEL_LOAD_SECONDS = Gauge(
+    "backend_model_load_seconds", "Time taken to load the image model",
+    multiprocess_mode="max"
+)
+
+_stages = {name: STAGE_SECONDS.labels(name) for name in STAGES}
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as one observation of a pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stages[name].observe(time.perf_counter() - start)
+
+
+def outcome(status_code: int) -> str:
+    """Map an HTTP status to a low-cardinality outcome label."""
+    if status_code < 400:
+        return "success"
+    if status_code < 500:
+        return "client_error"
+    return "server_error"
+
+
+def render() -> bytes:
+    """Current metrics in the Prometheus text format."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    IN_FLIGHT.inc()
+
+
+def _after_request(response):
+    # Label by URL rule so path parameters don't create new series
+    endpoint = request.url_rule.rule if request.url_rule is not None else "other"
+    if "metrics_start" in g:
+        REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - g.metrics_start)
+    REQUESTS.labels(endpoint, outcome(response.status_code)).inc()
+    return response
+
+
+def _teardown_request(exc):
+    if "metrics_start" in g:
+        IN_FLIGHT.dec()
+
+
+def init_metrics(app):
+    """Record request metrics for `app` and serve them at /metrics."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render(), content_type=CONTENT_TYPE_LATEST)
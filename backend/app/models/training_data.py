@@ -1,29 +1,24 @@
 """Module for managing training data models in the database."""
 from datetime import datetime
-import os
-from pathlib import Path
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-
-# Create database engine
-DB_PATH = Path(__file__).parent.parent.parent / 'data' / 'training.db'
-os.makedirs(DB_PATH.parent, exist_ok=True)
-engine = create_engine(f'sqlite:///{DB_PATH}')
-
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Create declarative base
-Base = declarative_base()
+from ..database import db
 
 class TrainingData(db.Model):
     """Model for storing training data information"""
+    # Match the listing's keyset order, (created_at, id), with and
+    # without a label filter
+    __table_args__ = (
+        db.Index('ix_training_data_label_created_at', 'label', 'created_at', 'id'),
+        db.Index('ix_training_data_created_at_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
     filepath = db.Column(db.String(255), nullable=False)
     label = db.Column(db.String(10), nullable=False)  # 'real' or 'fake'
+    # SHA-256 of the file content; also its key in the upload store.
+    # Null for rows uploaded before the store existed
+    sha256 = db.Column(db.String(64), unique=True, index=True)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
     def __repr__(self):
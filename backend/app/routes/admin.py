@@ -1,18 +1,45 @@
 """Admin routes for managing training data and model training."""
+import base64
+import binascii
+import json
 import os
-from flask import Blueprint, request, jsonify
+from datetime import datetime, timezone
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from werkzeug.utils import secure_filename
+from sqlalchemy import func, insert, select, tuple_
 from sqlalchemy.exc import SQLAlchemyError
 from typing import Dict, Any
+import tarfile
+import zipfile
 
-from ..models.training_data import TrainingData, SessionLocal
+from ..models.training_data import TrainingData
 from ..database import db
+from ..services.bulk_ingest import BulkIngestor, iter_tar, iter_zip, parse_label, parse_manifest
+from ..services.training_jobs import LABELS, TrainingJobRunner
+from ..services.upload_store import UploadStore
 
 admin_bp = Blueprint('admin', __name__)
+training_runner = TrainingJobRunner.from_env()
 
-UPLOAD_FOLDER = 'uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Uploaded images, stored once per distinct content
+upload_store = UploadStore(os.getenv('UPLOAD_STORE_DIR', 'uploads'))
+
+# Rows per page of the training data listing, and per query when exporting
+TRAINING_DATA_PAGE_SIZE = 100
+TRAINING_DATA_MAX_PAGE_SIZE = 1000
+TRAINING_DATA_EXPORT_PAGE_SIZE = 1000
+
+# Rows per transaction for bulk uploads
+BULK_INSERT_BATCH = int(os.getenv('BULK_INSERT_BATCH', '1000'))
+ARCHIVE_READERS = {'tar': iter_tar, 'zip': iter_zip}
+ARCHIVE_MIMETYPES = {
+    'application/x-tar': 'tar',
+    'application/x-gtar': 'tar',
+    'application/gzip': 'tar',
+    'application/x-gzip': 'tar',
+    'application/zip': 'zip',
+    'application/x-zip-compressed': 'zip'
+}
 
 @admin_bp.route('/training-data', methods=['POST'])
 def upload_training_data():
@@ -29,69 +56,360 @@ def upload_training_data():
         return jsonify({'error': 'Invalid label. Must be "real" or "fake"'}), 400
 
     try:
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
+        stored = upload_store.put(file.stream)
+    except OSError as e:
+        return jsonify({'error': f'Error saving file: {e}'}), 500
+
+    try:
+        existing = TrainingData.query.filter_by(sha256=stored.sha256).first()
+        if existing is not None:
+            return jsonify({
+                'message': 'Training data already uploaded',
+                'id': existing.id,
+                'label': existing.label,
+                'sha256': stored.sha256,
+                'duplicate': True
+            })
 
         # Save to database
         training_data = TrainingData(
-            filename=filename,
-            filepath=filepath,
-            label=label
+            filename=secure_filename(file.filename),
+            filepath=stored.path,
+            label=label,
+            sha256=stored.sha256
         )
         db.session.add(training_data)
         db.session.commit()
 
         return jsonify({
             'message': 'Training data uploaded successfully',
-            'id': training_data.id
+            'id': training_data.id,
+            'sha256': stored.sha256
         })
 
     except SQLAlchemyError as e:
+        # The stored file is left in place: a concurrent upload of the
+        # same content may own it (orphans are removed by /uploads/gc)
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def _insert_training_rows(rows):
+    """Insert TrainingData rows in one transaction"""
+    try:
+        db.session.execute(insert(TrainingData), rows)
+        db.session.commit()
+    except SQLAlchemyError:
         db.session.rollback()
+        raise
+
+def _existing_hashes(hashes):
+    """Content hashes among `hashes` that already have a row"""
+    existing = []
+    # Stay under SQLite's bound-parameter limit
+    for start in range(0, len(hashes), 500):
+        existing.extend(db.session.execute(
+            select(TrainingData.sha256).where(TrainingData.sha256.in_(hashes[start:start + 500]))
+        ).scalars())
+    return existing
+
+def _archive_kind(filename=None):
+    kind = request.args.get('format')
+    if kind is None and filename:
+        name = filename.lower()
+        kind = 'zip' if name.endswith('.zip') else 'tar' if '.tar' in name or name.endswith('.tgz') else None
+    if kind is None:
+        kind = ARCHIVE_MIMETYPES.get(request.mimetype)
+    return kind
+
+@admin_bp.route('/training-data/bulk', methods=['POST'])
+def upload_training_data_bulk():
+    """Upload many labelled training images at once.
+
+    Either a multipart form with `files` (plus a matching list of `labels`,
+    one `label` for all, or a `manifest` file) and/or an `archive`, or a raw
+    tar/zip request body, which is read as it streams in. Labels default to
+    the `label` query parameter.
+    """
+    is_form = request.mimetype == 'multipart/form-data'
+    # Reading form fields from a raw body would consume the archive
+    default_label = request.args.get('label') or (request.form.get('label') if is_form else None)
+    if default_label is not None and parse_label(default_label) is None:
+        return jsonify({'error': 'Invalid label. Must be "real" or "fake"'}), 400
+
+    manifest = None
+    if is_form and 'manifest' in request.files:
+        manifest = parse_manifest(request.files['manifest'].read().decode('utf-8', errors='replace'))
+
+    ingestor = BulkIngestor(upload_store, _insert_training_rows, _existing_hashes,
+                            batch_size=BULK_INSERT_BATCH, manifest=manifest,
+                            default_label=parse_label(default_label))
+    try:
+        if is_form:
+            files = [file for file in request.files.getlist('files') if file.filename]
+            archive = request.files.get('archive')
+            if not files and archive is None:
+                return jsonify({'error': 'No files provided'}), 400
+
+            labels = request.form.getlist('labels')
+            if labels and len(labels) != len(files):
+                return jsonify({'error': 'labels must have one entry per file'}), 400
+            for i, file in enumerate(files):
+                ingestor.add(file.filename, file.stream, labels[i] if labels else None)
+
+            if archive is not None:
+                kind = _archive_kind(archive.filename)
+                if kind not in ARCHIVE_READERS:
+                    return jsonify({'error': 'Unsupported archive format'}), 415
+                ingestor.ingest_archive(ARCHIVE_READERS[kind](archive.stream))
+        else:
+            kind = _archive_kind()
+            if kind not in ARCHIVE_READERS:
+                return jsonify({'error': 'Unsupported archive format; send a tar or zip body'}), 415
+            ingestor.ingest_archive(ARCHIVE_READERS[kind](request.stream))
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError) as e:
+        # Keep what was read before the archive broke off
+        summary = ingestor.finish()
+        summary['error'] = f'Invalid archive: {e}'
+        return jsonify(summary), 400
+
+    summary = ingestor.finish()
+    if summary['total'] == 0:
+        return jsonify({'error': 'No images found', **summary}), 400
+    return jsonify(summary)
+
+def _parse_time(value):
+    """Naive UTC datetime from an ISO 8601 string, as stored in created_at"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _encode_cursor(created_at, row_id):
+    payload = json.dumps([created_at.isoformat(), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+def _decode_cursor(cursor):
+    created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return datetime.fromisoformat(created_at), int(row_id)
+
+def _training_data_filters():
+    """WHERE clauses from the label, since and until query parameters.
+
+    Raises:
+        ValueError: If a parameter is invalid
+    """
+    filters = []
+    label = request.args.get('label')
+    if label is not None:
+        if label not in LABELS:
+            raise ValueError('Invalid label. Must be "real" or "fake"')
+        filters.append(TrainingData.label == label)
+    if request.args.get('since'):
+        filters.append(TrainingData.created_at >= _parse_time(request.args['since']))
+    if request.args.get('until'):
+        filters.append(TrainingData.created_at < _parse_time(request.args['until']))
+    return filters
+
+def _training_data_page(filters, after=None, limit=100):
+    """One page of rows, newest first, after an optional (created_at, id) key"""
+    query = select(
+        TrainingData.id, TrainingData.filename, TrainingData.label,
+        TrainingData.sha256, TrainingData.created_at
+    ).where(*filters)
+    if after is not None:
+        query = query.where(tuple_(TrainingData.created_at, TrainingData.id) < tuple_(*after))
+    query = query.order_by(TrainingData.created_at.desc(), TrainingData.id.desc()).limit(limit)
+    return db.session.execute(query).all()
+
+def _training_data_item(row):
+    return {
+        'id': row.id,
+        'filename': row.filename,
+        'label': row.label,
+        'sha256': row.sha256,
+        'created_at': row.created_at.isoformat()
+    }
+
+@admin_bp.route('/uploads/gc', methods=['POST'])
+def collect_upload_garbage():
+    """Delete stored upload files that no training data row references"""
+    try:
+        min_age = float(request.args.get('min_age', 3600))
+    except ValueError:
+        return jsonify({'error': 'min_age must be a number of seconds'}), 400
+    try:
+        removed = upload_store.collect_garbage(_existing_hashes, min_age=min_age)
+    except SQLAlchemyError as e:
         return jsonify({'error': str(e)}), 500
+    return jsonify({'removed': removed})
 
 @admin_bp.route('/training-data', methods=['GET'])
 def get_training_data():
-    """Get list of training data"""
+    """Get one page of training data, newest first.
+
+    Pass the returned `next_cursor` as `cursor` to get the next page.
+    Filters: `label`, and `since`/`until` ISO 8601 times on created_at.
+    """
     try:
-        training_data = TrainingData.query.all()
-        return jsonify({
-            'training_data': [
-                {
-                    'id': data.id,
-                    'filename': data.filename,
-                    'label': data.label,
-                    'created_at': data.created_at.isoformat()
-                }
-                for data in training_data
-            ]
-        })
+        limit = min(max(int(request.args.get('limit', TRAINING_DATA_PAGE_SIZE)), 1),
+                    TRAINING_DATA_MAX_PAGE_SIZE)
+        filters = _training_data_filters()
+        cursor = request.args.get('cursor')
+        after = _decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError, binascii.Error) as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+
+    try:
+        rows = _training_data_page(filters, after, limit + 1)
+    except SQLAlchemyError as e:
+        return jsonify({'error': str(e)}), 500
+
+    # The extra row only tells whether another page exists
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id)
+    return jsonify({
+        'training_data': [_training_data_item(row) for row in rows],
+        'next_cursor': next_cursor
+    })
+
+@admin_bp.route('/training-data/export', methods=['GET'])
+def export_training_data():
+    """Stream all matching training data as NDJSON, one row per line"""
+    try:
+        filters = _training_data_filters()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+
+    def generate():
+        # Page through by key so no query holds more than one page
+        after = None
+        while True:
+            rows = _training_data_page(filters, after, TRAINING_DATA_EXPORT_PAGE_SIZE)
+            for row in rows:
+                yield json.dumps(_training_data_item(row)) + '\n'
+            if len(rows) < TRAINING_DATA_EXPORT_PAGE_SIZE:
+                break
+            after = (rows[-1].created_at, rows[-1].id)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=training_data.ndjson'})
+
+@admin_bp.route('/training-data/summary', methods=['GET'])
+def get_training_data_summary():
+    """Count training data per label, with each label's first and last upload"""
+    try:
+        filters = _training_data_filters()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+
+    try:
+        rows = db.session.execute(
+            select(
+                TrainingData.label,
+                func.count(),
+                func.min(TrainingData.created_at),
+                func.max(TrainingData.created_at)
+            ).where(*filters).group_by(TrainingData.label)
+        ).all()
     except SQLAlchemyError as e:
         return jsonify({'error': str(e)}), 500
 
+    by_label = {
+        label: {
+            'count': count,
+            'first_uploaded': first.isoformat() if first else None,
+            'last_uploaded': last.isoformat() if last else None
+        }
+        for label, count, first, last in rows
+    }
+    return jsonify({
+        'total': sum(item['count'] for item in by_label.values()),
+        'by_label': by_label
+    })
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp else None
+
+def _job_response(job):
+    """Public view of a training job row"""
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'progress': job['progress'],
+        'created_at': _iso(job['created_at']),
+        'started_at': _iso(job['started_at']),
+        'finished_at': _iso(job['finished_at']),
+        'duration': job['duration'],
+        'images': job['images'],
+        'images_decoded': job['extracted'],
+        'images_per_sec': job['images_per_sec'],
+        'accuracy': job['accuracy'],
+        'model_version': job['model_version'],
+        'error': job['error']
+    }
+
 @admin_bp.route('/model/train', methods=['POST'])
 def train_model():
-    """Trigger model training"""
+    """Start a background training job over all training data"""
     try:
-        # This would typically be a long-running task
-        # In production, you'd want to use a task queue like Celery
+        # The content hash doubles as the feature store key, so images
+        # trained on before are not read again
+        rows = db.session.execute(
+            select(TrainingData.filepath, TrainingData.label, TrainingData.sha256)
+        )
+        samples = [
+            (filepath, LABELS[label], sha256)
+            for filepath, label, sha256 in rows
+            if label in LABELS
+        ]
+        if not samples:
+            return jsonify({'error': 'No training data available'}), 400
+
+        job = training_runner.submit(samples)
         return jsonify({
             'message': 'Model training initiated',
-            'status': 'pending'
-        })
+            **_job_response(job)
+        }), 202
     except SQLAlchemyError as e:
         return jsonify({'error': str(e)}), 500
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+
+@admin_bp.route('/model/train/<job_id>', methods=['GET'])
+def get_training_job(job_id):
+    """Get the state of one training job"""
+    job = training_runner.store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(_job_response(job))
+
+@admin_bp.route('/model/jobs', methods=['GET'])
+def list_training_jobs():
+    """List recent training jobs"""
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+    return jsonify({'jobs': [_job_response(job) for job in training_runner.store.list(limit)]})
 
 @admin_bp.route('/model/status', methods=['GET'])
 def get_model_status():
     """Get current model status"""
-    try:
-        # This would typically check the status of the training task
-        return jsonify({
-            'status': 'ready',
-            'last_trained': None,
-            'accuracy': None
-        })
-    except SQLAlchemyError as e:
-        return jsonify({'error': str(e)}), 500
+    latest = training_runner.store.latest()
+    trained = training_runner.store.latest('succeeded')
+    if latest is not None and latest['status'] in ('queued', 'running'):
+        status = 'training'
+    else:
+        status = 'ready' if trained is not None else 'untrained'
+    return jsonify({
+        'status': status,
+        'last_trained': _iso(trained['finished_at']) if trained else None,
+        'accuracy': trained['accuracy'] if trained else None,
+        'duration': trained['duration'] if trained else None,
+        'images_per_sec': trained['images_per_sec'] if trained else None,
+        'model_version': trained['model_version'] if trained else None,
+        'current_job': _job_response(latest) if latest is not None else None
+    })
@@ -1,20 +1,57 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
 import os
+import time
 import cv2
 import numpy as np
 from ..services.image_processor import ImageProcessor
 from ..services.metadata_extractor import MetadataExtractor
+from ..metrics import MODEL_LOAD_SECONDS, stage
+from ..shared import PROFILE_HEADER, PROFILE_MODE_HEADER, TRACE_HEADER, PredictionCache
+from .profiles import profiler
 
 image_bp = Blueprint('image', __name__)
+load_start = time.perf_counter()
 image_processor = ImageProcessor()
+MODEL_LOAD_SECONDS.set(time.perf_counter() - load_start)
 metadata_extractor = MetadataExtractor()
+# Its own disk file: the ML service caches different models' results
+prediction_cache = PredictionCache.from_env('BACKEND_CACHE_DB_PATH')
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+ANALYZE_BATCH_MAX_ITEMS = int(os.getenv('ANALYZE_BATCH_MAX_ITEMS', '256'))
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _analyze(image_data, use_cache=True):
+    """Extract metadata and classify an image.
+    
+    Returns:
+        tuple: (metadata dict, prediction dict)
+    """
+    # Serve the newest model published by a training job
+    image_processor.reload_if_changed()
+    
+    # Extract metadata
+    with stage('metadata'):
+        metadata = metadata_extractor.extract(image_data)
+    
+    # Analyze image for fakeness, reusing results for images already seen
+    # by the current model (untrained predictions are random, so skip them)
+    if use_cache and image_processor.is_trained:
+        cache_key = PredictionCache.key(image_data)
+        model_version = image_processor.model_version
+        prediction = prediction_cache.get(cache_key, model_version)
+        if prediction is None:
+            prediction = image_processor.analyze(image_data)
+            # Skip caching if a reload swapped the model in the meantime
+            if image_processor.model_version == model_version:
+                prediction_cache.put(cache_key, model_version, prediction)
+    else:
+        prediction = image_processor.analyze(image_data)
+    return metadata, prediction
+
 @image_bp.route('/analyze', methods=['POST'])
 def analyze_image():
     if 'file' not in request.files and 'url' not in request.form:
@@ -35,21 +72,79 @@ def analyze_image():
         else:
             # Process URL
             url = request.form['url']
-            image_data = image_processor.download_image(url)
+            with stage('fetch'):
+                image_data = image_processor.download_image(url)
 
-        # Extract metadata
-        metadata = metadata_extractor.extract(image_data)
-        
-        # Analyze image for fakeness
-        prediction = image_processor.analyze(image_data)
+        # Profiled requests skip the cache so the trace shows real work
+        profile_mode = profiler.select(request.headers.get(PROFILE_HEADER),
+                                       request.headers.get(PROFILE_MODE_HEADER))
+        trace_name = None
+        if profile_mode:
+            (metadata, prediction), trace_name = profiler.run(
+                'analyze', profile_mode, _analyze, image_data, use_cache=False
+            )
+        else:
+            metadata, prediction = _analyze(image_data)
         
-        return jsonify({
+        response = jsonify({
             'result': {
                 'is_fake': prediction['is_fake'],
                 'confidence': prediction['confidence'],
                 'metadata': metadata
             }
         })
+        if trace_name:
+            response.headers[TRACE_HEADER] = trace_name
+        return response
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@image_bp.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze many uploaded `files` in one call, with per-item results"""
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    if len(files) > ANALYZE_BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Too many files: {len(files)} (maximum {ANALYZE_BATCH_MAX_ITEMS})'}), 413
+
+    try:
+        results = []
+        images_data = []
+        for file in files:
+            result = {'filename': file.filename}
+            if not allowed_file(file.filename):
+                result['error'] = 'Invalid file type'
+                image_data = None
+            else:
+                image_data = file.read()
+            results.append(result)
+            images_data.append(image_data)
+
+        valid = [index for index, image_data in enumerate(images_data) if image_data is not None]
+        with stage('metadata'):
+            metadata = metadata_extractor.extract_batch([images_data[index] for index in valid])
+        for index, item_metadata in zip(valid, metadata):
+            results[index]['metadata'] = item_metadata
+
+        # Score every valid image with one batched feature extraction
+        image_processor.reload_if_changed()
+        predictions = image_processor.analyze_batch([images_data[index] for index in valid])
+        for index, prediction in zip(valid, predictions):
+            results[index].update(prediction)
+
+        succeeded = sum(1 for result in results if 'error' not in result)
+        return jsonify({
+            'results': results,
+            'total': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@image_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(prediction_cache.stats())
@@ -0,0 +1,24 @@
+"""Routes for listing and downloading captured request profiles."""
+from flask import Blueprint, jsonify, request, send_file
+
+from ..shared import PROFILE_HEADER, RequestProfiler
+
+profiles_bp = Blueprint('profiles', __name__)
+profiler = RequestProfiler.from_env()
+
+@profiles_bp.route('', methods=['GET'])
+def list_profiles():
+    """List captured request traces (requires the X-Profile token)"""
+    if not profiler.authorized(request.headers.get(PROFILE_HEADER)):
+        return jsonify({'error': 'Profiling access denied'}), 403
+    return jsonify({'traces': profiler.list_traces()})
+
+@profiles_bp.route('/<name>', methods=['GET'])
+def download_profile(name):
+    """Download one captured trace (requires the X-Profile token)"""
+    if not profiler.authorized(request.headers.get(PROFILE_HEADER)):
+        return jsonify({'error': 'Profiling access denied'}), 403
+    path = profiler.trace_path(name)
+    if path is None:
+        return jsonify({'error': 'Trace not found'}), 404
+    return send_file(path, as_attachment=True, download_name=name)
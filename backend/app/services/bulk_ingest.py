@@ -0,0 +1,234 @@
+"""Bulk ingestion of labelled training images.
+
+Images arrive either as many uploaded files or as one tar/zip archive.
+Tar archives are read straight from the request stream; zip archives need
+random access and are spooled to a temporary file first. Each image is
+written to the upload store as it is read, and rows are inserted in batches
+of `batch_size` per transaction. Images whose content hash is already in
+the database are reported as duplicates and not inserted again.
+
+Labels come from a manifest of ``<name>\\t<label>`` (or ``<name>,<label>``)
+lines, where the label is real/fake or 0/1, or otherwise from a ``real`` or
+``fake`` directory in the member's path. An archive's manifest is any
+member named in MANIFEST_NAMES; put it first so rows can be inserted while
+the archive streams in. Images read before the manifest wait for it.
+"""
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+import zlib
+from typing import Callable, Dict, IO, Iterable, Iterator, List, Optional, Set, Tuple
+
+from werkzeug.utils import secure_filename
+
+from .upload_store import UploadStore
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+MANIFEST_NAMES = {'manifest.tsv', 'manifest.csv', 'manifest.txt', 'labels.tsv', 'labels.csv'}
+LABEL_NAMES = {'real': 'real', 'fake': 'fake', '0': 'real', '1': 'fake'}
+# Raised while reading a member out of a truncated or corrupt archive
+ARCHIVE_READ_ERRORS = (tarfile.TarError, zipfile.BadZipFile, EOFError, zlib.error)
+
+
+def allowed_image(name: str) -> bool:
+    return '.' in name and name.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def parse_label(value: Optional[str]) -> Optional[str]:
+    """Normalize a real/fake or 0/1 label, or None if invalid."""
+    if value is None:
+        return None
+    return LABEL_NAMES.get(value.strip().lower())
+
+
+def label_from_path(name: str) -> Optional[str]:
+    """Label from a ``real`` or ``fake`` directory in an archive path."""
+    parts = name.replace('\\', '/').lower().split('/')[:-1]
+    for label in ('real', 'fake'):
+        if label in parts:
+            return label
+    return None
+
+
+def parse_manifest(text: str) -> Dict[str, str]:
+    """Map names to labels from manifest lines; invalid lines are skipped."""
+    labels = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        separator = '\t' if '\t' in line else ','
+        name, _, value = line.rpartition(separator)
+        label = parse_label(value)
+        if name and label is not None:
+            labels[name.strip()] = label
+    return labels
+
+
+def iter_tar(stream: IO[bytes]) -> Iterator[Tuple[str, IO[bytes]]]:
+    """Yield (member name, file object) from a tar stream, reading sequentially."""
+    with tarfile.open(fileobj=stream, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, archive.extractfile(member)
+
+
+def iter_zip(stream: IO[bytes]) -> Iterator[Tuple[str, IO[bytes]]]:
+    """Yield (member name, file object) from a zip stream.
+
+    Zip's central directory is at the end, so the stream is copied to a
+    temporary file first.
+    """
+    with tempfile.TemporaryFile() as spool:
+        shutil.copyfileobj(stream, spool, 1 << 20)
+        spool.seek(0)
+        with zipfile.ZipFile(spool) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield info.filename, member
+
+
+class BulkIngestor:
+    """Write images to the upload store and insert their rows in batches.
+
+    Args:
+        store: Upload store images are written to
+        insert_rows: Called with a list of row dicts (filename, filepath,
+            label, sha256) to insert them in one transaction
+        existing_hashes: Called with content hashes; returns those already
+            in the database
+        batch_size: Rows per transaction
+        manifest: Optional name -> label mapping known up front
+        default_label: Label for items without a manifest entry or label
+            directory
+    """
+    def __init__(self, store: UploadStore, insert_rows: Callable[[List[dict]], None],
+                 existing_hashes: Callable[[List[str]], Iterable[str]],
+                 batch_size: int = 1000, manifest: Optional[Dict[str, str]] = None,
+                 default_label: Optional[str] = None):
+        self.store = store
+        self.insert_rows = insert_rows
+        self.existing_hashes = existing_hashes
+        self.batch_size = batch_size
+        self.manifest = manifest
+        self.default_label = default_label
+        self.results: List[dict] = []
+        self._rows: List[Tuple[dict, dict]] = []
+        self._pending: List[Tuple[dict, dict]] = []
+        self._inserted: Set[str] = set()
+
+    def _label_for(self, name: str) -> Optional[str]:
+        if self.manifest is not None:
+            label = self.manifest.get(name) or self.manifest.get(os.path.basename(name))
+            if label is not None:
+                return label
+        return label_from_path(name) or self.default_label
+
+    def add(self, name: str, source: IO[bytes], label: Optional[str] = None):
+        """Write one image to disk and queue its row.
+
+        Args:
+            name: Original file or archive member name
+            source: Readable file object with the image bytes
+            label: Explicit label, overriding the manifest and directories
+        """
+        result = {'index': len(self.results), 'name': name}
+        self.results.append(result)
+        if not allowed_image(name):
+            result.update(status='error', detail='Invalid file type')
+            return
+
+        # put() removes its temporary file if reading fails part way
+        try:
+            stored = self.store.put(source)
+        except ARCHIVE_READ_ERRORS as e:
+            result.update(status='error', detail=f'Error reading from archive: {e}')
+            return
+        except OSError as e:
+            result.update(status='error', detail=f'Error saving file: {e}')
+            return
+
+        row = {
+            'filename': secure_filename(os.path.basename(name)) or 'image',
+            'filepath': stored.path,
+            'sha256': stored.sha256
+        }
+        label = parse_label(label) if label is not None else self._label_for(name)
+        if label is None and self.manifest is None:
+            # The archive's manifest may still arrive
+            self._pending.append((result, row))
+            return
+        self._queue(result, row, label)
+
+    def set_manifest(self, manifest: Dict[str, str]):
+        """Apply a manifest that arrived mid-stream to the waiting items."""
+        self.manifest = manifest
+        pending, self._pending = self._pending, []
+        for result, row in pending:
+            self._queue(result, row, self._label_for(result['name']))
+
+    def _queue(self, result: dict, row: dict, label: Optional[str]):
+        # Stored files are never deleted here: identical content may be
+        # referenced by another row (see UploadStore.collect_garbage)
+        if label is None:
+            result.update(status='error', detail='No label: not in the manifest and not under real/ or fake/')
+            return
+        row['label'] = label
+        self._rows.append((result, row))
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Insert the queued rows that are not duplicates in one transaction."""
+        if not self._rows:
+            return
+        batch, self._rows = self._rows, []
+        new = []
+        try:
+            existing = self.existing_hashes([row['sha256'] for _, row in batch])
+            for result, row in batch:
+                if row['sha256'] in existing or row['sha256'] in self._inserted:
+                    result.update(status='duplicate', sha256=row['sha256'])
+                else:
+                    self._inserted.add(row['sha256'])
+                    new.append((result, row))
+            if new:
+                self.insert_rows([row for _, row in new])
+        except Exception as e:
+            # Only this call's inserts are rolled back; earlier batches are committed
+            for _, row in new:
+                self._inserted.discard(row['sha256'])
+            for result, _ in batch:
+                if result.get('status') != 'duplicate':
+                    result.update(status='error', detail=f'Database error: {e}')
+            return
+        for result, row in new:
+            result.update(status='created', label=row['label'], filename=row['filename'],
+                          sha256=row['sha256'])
+
+    def ingest_archive(self, members: Iterator[Tuple[str, IO[bytes]]]):
+        """Ingest every image member of an archive, reading any manifest in it."""
+        for name, source in members:
+            if os.path.basename(name).lower() in MANIFEST_NAMES:
+                self.set_manifest(parse_manifest(source.read().decode('utf-8', errors='replace')))
+            elif not os.path.basename(name).startswith('.'):
+                self.add(name, source)
+
+    def finish(self) -> dict:
+        """Resolve items still waiting for a label, insert the rest and summarize."""
+        if self._pending:
+            self.set_manifest(self.manifest or {})
+        self.flush()
+        counts = {'created': 0, 'duplicate': 0, 'error': 0}
+        for result in self.results:
+            counts[result['status']] += 1
+        return {
+            'results': self.results,
+            'total': len(self.results),
+            'created': counts['created'],
+            'duplicates': counts['duplicate'],
+            'failed': counts['error']
+        }
@@ -0,0 +1,132 @@
+"""Vectorized inference for fitted scikit-learn random forests.
+
+`RandomForestClassifier.predict_proba` walks each tree separately and pays
+Python and joblib overhead per estimator, which dominates when scoring one
+image. `CompiledForest` flattens every tree into shared node arrays and
+walks all trees for all rows at once, one NumPy step per tree level.
+
+The arithmetic mirrors scikit-learn so probabilities are identical: inputs
+are cast to float32 and compared with ``<=`` against the float64
+thresholds, each tree's leaf values are normalized only where the installed
+`DecisionTreeClassifier.predict_proba` does it, and per-tree probabilities
+are summed in estimator order before dividing by the number of trees.
+"""
+import numpy as np
+from sklearn import __version__ as SKLEARN_VERSION
+
+TREE_LEAF = -1
+
+# scikit-learn 1.4 stores class fractions in `tree_.value` and returns them
+# unchanged; earlier versions store weighted counts and normalize them.
+# Normalizing fractions again can change the last bit
+NORMALIZE_LEAVES = tuple(int(part) for part in SKLEARN_VERSION.split('.')[:2]) < (1, 4)
+
+
+class CompiledForest:
+    """Random forest classifier compiled into flat node arrays.
+
+    Build with `from_estimator`; the compiled form is independent of the
+    estimator afterwards.
+    """
+    def __init__(self, feature, threshold, left, right, value, roots, classes, n_features, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_estimator(cls, forest) -> "CompiledForest":
+        """Compile a fitted single-output `RandomForestClassifier`."""
+        if forest.n_outputs_ != 1:
+            raise ValueError("CompiledForest supports single-output forests only")
+
+        n_classes = len(forest.classes_)
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count, dtype=np.intp)
+            is_leaf = tree.children_left == TREE_LEAF
+
+            # Leaves point at themselves, so finished rows stay put while
+            # deeper trees are still being walked
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(np.asarray(tree.threshold, dtype=np.float64))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left).astype(np.intp) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right).astype(np.intp) + offset)
+
+            # DecisionTreeClassifier.predict_proba normalization
+            value = np.array(tree.value[:, 0, :n_classes], dtype=np.float64)
+            if NORMALIZE_LEAVES:
+                normalizer = value.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                value /= normalizer
+            values.append(value)
+
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=np.asarray(forest.classes_),
+            n_features=forest.n_features_in_,
+            max_depth=max_depth,
+        )
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf index (into the flat node arrays) of every row in every tree.
+
+        Args:
+            X: Array of shape (n_samples, n_features)
+
+        Returns:
+            np.ndarray: Array of shape (n_samples, n_trees)
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected input of shape (n_samples, {self.n_features_in_}), got {X.shape}")
+
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            next_nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            if np.array_equal(next_nodes, nodes):
+                break
+            nodes = next_nodes
+        return nodes
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Class probabilities, identical to the source forest's `predict_proba`.
+
+        Args:
+            X: Array of shape (n_samples, n_features)
+
+        Returns:
+            np.ndarray: Array of shape (n_samples, n_classes)
+        """
+        tree_proba = self.value[self.apply(X)]
+        # cumsum adds strictly in tree order, like the forest's accumulation
+        proba = np.cumsum(tree_proba, axis=1)[:, -1]
+        proba /= len(self.roots)
+        return proba
+
+    def matches(self, forest, X) -> bool:
+        """Whether probabilities on `X` are identical to `forest.predict_proba`."""
+        return np.array_equal(self.predict_proba(X), forest.predict_proba(X))
+
+    def predict(self, X) -> np.ndarray:
+        """Most probable class for each row."""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
@@ -0,0 +1,145 @@
+"""On-disk store of extracted image feature vectors.
+
+Features are keyed by the SHA-256 of the image content and stored under a
+directory per feature-extractor version, so changing the extractor never
+mixes old and new vectors. Each `put` appends a shard of two `.npy` files
+(keys and a float64 feature matrix) that are read back memory-mapped; once
+there are more than `max_shards` shards they are merged into one.
+"""
+import glob
+import hashlib
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+KEYS_SUFFIX = ".keys.npy"
+FEATURES_SUFFIX = ".features.npy"
+
+
+class FeatureStore:
+    """Feature vectors keyed by content hash, for one extractor version.
+
+    Args:
+        root_dir: Base directory of the store
+        version: Feature-extractor version; each version has its own directory
+        num_features: Length of each feature vector
+        max_shards: Shard count above which shards are merged
+    """
+    def __init__(self, root_dir: str, version: int, num_features: int, max_shards: int = 16):
+        self.directory = os.path.join(root_dir, f"v{version}")
+        self.num_features = num_features
+        self.max_shards = max_shards
+        self._lock = threading.Lock()
+        self._shards: Dict[str, np.ndarray] = {}
+        self._index: Dict[str, Tuple[str, int]] = {}
+        self._load()
+
+    @staticmethod
+    def key(data: bytes) -> str:
+        """Content key for encoded image bytes or raw array bytes."""
+        return hashlib.sha256(data).hexdigest()
+
+    def _shard_names(self) -> List[str]:
+        paths = glob.glob(os.path.join(self.directory, "*" + KEYS_SUFFIX))
+        return sorted(os.path.basename(path)[:-len(KEYS_SUFFIX)] for path in paths)
+
+    def _load(self):
+        self._shards.clear()
+        self._index.clear()
+        for name in self._shard_names():
+            features_path = os.path.join(self.directory, name + FEATURES_SUFFIX)
+            if not os.path.exists(features_path):
+                continue
+            keys = np.load(os.path.join(self.directory, name + KEYS_SUFFIX))
+            self._shards[name] = np.load(features_path, mmap_mode="r")
+            for row, key in enumerate(keys.tolist()):
+                self._index[key] = (name, row)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def get_many(self, keys: Sequence[str], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Fill rows of `out` with the stored vectors for `keys`.
+
+        Args:
+            keys: Content keys
+            out: Optional (len(keys), num_features) array to fill; rows for
+                unknown keys are left untouched
+
+        Returns:
+            np.ndarray: `out` (use `missing` to find the unknown keys)
+        """
+        if out is None:
+            out = np.empty((len(keys), self.num_features), dtype=np.float64)
+        with self._lock:
+            for row, key in enumerate(keys):
+                location = self._index.get(key)
+                if location is not None:
+                    name, shard_row = location
+                    out[row] = self._shards[name][shard_row]
+        return out
+
+    def missing(self, keys: Sequence[str]) -> List[int]:
+        """Positions in `keys` that have no stored vector."""
+        with self._lock:
+            return [row for row, key in enumerate(keys) if key not in self._index]
+
+    def put_many(self, keys: Sequence[str], features: np.ndarray):
+        """Store vectors for new keys as one shard.
+
+        Args:
+            keys: Content keys
+            features: Matrix of shape (len(keys), num_features)
+        """
+        with self._lock:
+            new_rows = {}
+            for row, key in enumerate(keys):
+                if key not in self._index:
+                    new_rows.setdefault(key, row)
+            if not new_rows:
+                return
+
+            rows = list(new_rows.values())
+            name = f"shard_{uuid.uuid4().hex}"
+            self._write_shard(name, list(new_rows), np.asarray(features, dtype=np.float64)[rows])
+            for shard_row, key in enumerate(new_rows):
+                self._index[key] = (name, shard_row)
+
+            if len(self._shards) > self.max_shards:
+                self._compact()
+
+    def _write_shard(self, name: str, keys: List[str], features: np.ndarray):
+        """Write a shard, features first, so a shard is visible only when complete."""
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, name)
+        for suffix, array in ((FEATURES_SUFFIX, features), (KEYS_SUFFIX, np.asarray(keys, dtype="U64"))):
+            tmp_path = base + ".tmp" + suffix
+            np.save(tmp_path, array)
+            os.replace(tmp_path, base + suffix)
+        self._shards[name] = np.load(base + FEATURES_SUFFIX, mmap_mode="r")
+
+    def _compact(self):
+        """Merge every shard into one and delete the old ones."""
+        old_names = list(self._shards)
+        keys = list(self._index)
+        features = np.empty((len(keys), self.num_features), dtype=np.float64)
+        for row, key in enumerate(keys):
+            name, shard_row = self._index[key]
+            features[row] = self._shards[name][shard_row]
+
+        name = f"shard_{uuid.uuid4().hex}"
+        self._write_shard(name, keys, features)
+        for old_name in old_names:
+            del self._shards[old_name]
+            for suffix in (KEYS_SUFFIX, FEATURES_SUFFIX):
+                try:
+                    os.remove(os.path.join(self.directory, old_name + suffix))
+                except OSError:
+                    pass
+        self._index = {key: (name, row) for row, key in enumerate(keys)}
@@ -0,0 +1,47 @@
+"""Blocking access to the ML service's pooled image downloader.
+
+The Flask request threads share one pooled async client running on a
+background event loop.
+"""
+import asyncio
+import threading
+from typing import Optional
+
+from ..shared import ImageFetcher
+
+
+class SyncImageFetcher:
+    """Blocking front end to `ImageFetcher` for synchronous callers.
+
+    The async fetcher runs on a single daemon event-loop thread, so every
+    Flask worker thread shares the same connection pool and per-host limits.
+
+    Args:
+        fetcher: Fetcher to run; defaults to one configured from the
+            environment
+    """
+    def __init__(self, fetcher: Optional[ImageFetcher] = None):
+        self.fetcher = fetcher or ImageFetcher.from_env()
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="image-fetcher",
+                    daemon=True
+                )
+                thread.start()
+        return self._loop
+
+    def fetch(self, url: str) -> bytes:
+        """Download a URL, blocking only the calling thread.
+
+        Raises:
+            FetchError: See `ImageFetcher.fetch`
+        """
+        future = asyncio.run_coroutine_threadsafe(self.fetcher.fetch(url), self._get_loop())
+        return future.result()
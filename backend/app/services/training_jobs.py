@@ -0,0 +1,318 @@
+"""Background training jobs for the random forest image model.
+
+Jobs run in a separate, lower-priority worker process, so training never
+competes with the request threads for the GIL and yields the CPU to them
+under load. Job state lives in SQLite and is updated by the worker, so any
+web process can report it. A finished model is published by atomically
+renaming it onto the serving path (`RF_MODEL_PATH`), where
+`ImageProcessor.reload_if_changed` picks it up.
+"""
+import logging
+import multiprocessing
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+LABELS = {'real': 0, 'fake': 1}
+
+# (image file path, label, content SHA-256 or None)
+Sample = Tuple[str, int, Optional[str]]
+
+# Columns a worker or the runner may update
+JOB_FIELDS = (
+    'status', 'stage', 'progress', 'owner_pid', 'worker_pid', 'started_at', 'finished_at',
+    'duration', 'images', 'extracted', 'images_per_sec', 'accuracy', 'model_version', 'error'
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS training_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    owner_pid INTEGER,
+    worker_pid INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    duration REAL,
+    images INTEGER,
+    extracted INTEGER,
+    images_per_sec REAL,
+    accuracy REAL,
+    model_version TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_training_jobs_created_at ON training_jobs (created_at);
+"""
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite table of training jobs, shared by web and worker processes.
+
+    Args:
+        db_path: SQLite database file
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets workers write while web
+        # processes read
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def create(self) -> Dict[str, Any]:
+        """Insert a queued job owned by this process."""
+        job_id = uuid.uuid4().hex
+        self._conn().execute(
+            'INSERT INTO training_jobs (id, status, stage, progress, owner_pid, created_at) '
+            'VALUES (?, ?, ?, 0, ?, ?)',
+            (job_id, 'queued', 'queued', os.getpid(), time.time())
+        )
+        return self.get(job_id)
+
+    def update(self, job_id: str, **fields):
+        unknown = set(fields) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f'Unknown job fields: {sorted(unknown)}')
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        self._conn().execute(
+            f'UPDATE training_jobs SET {assignments} WHERE id = ?',
+            (*fields.values(), job_id)
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute('SELECT * FROM training_jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list(self, limit: int = 20) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            'SELECT * FROM training_jobs ORDER BY created_at DESC LIMIT ?', (limit,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def latest(self, status: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if status is None:
+            jobs = self.list(limit=1)
+            return jobs[0] if jobs else None
+        row = self._conn().execute(
+            'SELECT * FROM training_jobs WHERE status = ? ORDER BY created_at DESC LIMIT 1', (status,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def fail_orphans(self) -> int:
+        """Mark jobs whose owning or worker process has died as failed.
+
+        Returns:
+            int: Number of jobs marked
+        """
+        rows = self._conn().execute(
+            "SELECT id, status, owner_pid, worker_pid FROM training_jobs "
+            "WHERE status IN ('queued', 'running')"
+        ).fetchall()
+        failed = 0
+        for row in rows:
+            pid = row['worker_pid'] if row['status'] == 'running' else row['owner_pid']
+            if not _pid_alive(pid):
+                self.update(row['id'], status='failed', error='Interrupted', finished_at=time.time())
+                failed += 1
+        return failed
+
+
+def _lower_priority(niceness: int):
+    """Worker initializer: yield the CPU to the web workers."""
+    try:
+        os.nice(niceness)
+    except OSError:
+        pass
+
+
+def _split(samples: Sequence[Sample], holdout: float,
+           seed: int) -> Tuple[List[Sample], List[Sample]]:
+    """Shuffle deterministically and split off a validation set."""
+    samples = list(samples)
+    random.Random(seed).shuffle(samples)
+    count = int(len(samples) * holdout)
+    # Too few images to hold any out: train on all and skip accuracy
+    if count == 0 or count == len(samples):
+        return samples, []
+    return samples[count:], samples[:count]
+
+
+def run_training_job(job_id: str, jobs_db: str, samples: Sequence[Sample],
+                     model_path: Optional[str] = None, feature_store_dir: Optional[str] = None,
+                     holdout: float = 0.2, seed: int = 42):
+    """Train, evaluate and publish a model (runs in the worker process).
+
+    Args:
+        job_id: Job to report progress on
+        jobs_db: JobStore database path
+        samples: (image file path, label, content hash) triples, label 0
+            real or 1 fake; a known hash lets already-extracted images be
+            skipped without reading them
+        model_path: Serving path to publish to (defaults to RF_MODEL_PATH)
+        feature_store_dir: Feature store directory (defaults to FEATURE_STORE_DIR)
+        holdout: Fraction of samples held out to measure accuracy
+        seed: Seed for the holdout split
+    """
+    from .image_processor import ImageProcessor
+
+    store = JobStore(jobs_db)
+    start = time.time()
+    store.update(job_id, status='running', stage='extracting features', progress=0.05,
+                 worker_pid=os.getpid(), started_at=start)
+    try:
+        # The worker is a single low-priority process; don't fan out further
+        processor = ImageProcessor(feature_workers=int(os.getenv('TRAINING_FEATURE_WORKERS', '1')),
+                                   model_path=model_path, feature_store_dir=feature_store_dir)
+        train_samples, val_samples = _split(samples, holdout, seed)
+
+        paths, labels, keys = zip(*train_samples)
+        # Fitting publishes the model: it is written to a temporary file
+        # and renamed onto the serving path
+        extracted = processor.train_from_files(paths, labels, keys=keys)
+        store.update(job_id, stage='evaluating', progress=0.8, extracted=extracted)
+
+        accuracy = None
+        if val_samples:
+            val_paths, val_labels, val_keys = zip(*val_samples)
+            accuracy = processor.evaluate_files(val_paths, val_labels, keys=val_keys)
+
+        finished = time.time()
+        duration = finished - start
+        store.update(
+            job_id, status='succeeded', stage='published', progress=1.0,
+            finished_at=finished, duration=duration, images=len(samples),
+            images_per_sec=len(samples) / duration if duration > 0 else None,
+            accuracy=accuracy, model_version=processor.model_version
+        )
+    except Exception as e:
+        logging.exception(f'Training job {job_id} failed')
+        finished = time.time()
+        store.update(job_id, status='failed', finished_at=finished,
+                     duration=finished - start, error=str(e))
+
+
+class TrainingJobRunner:
+    """Queue training jobs onto a low-priority worker process.
+
+    Jobs submitted while one is running wait their turn. The worker process
+    is spawned (not forked) so it does not inherit the web server's
+    threads.
+
+    Args:
+        store: JobStore recording job state
+        max_workers: Concurrent training jobs
+        niceness: Priority decrease applied to worker processes
+    """
+    def __init__(self, store: JobStore, max_workers: int = 1, niceness: int = 10):
+        self.store = store
+        self.max_workers = max_workers
+        self.niceness = niceness
+        self._executor = None
+        self._lock = threading.Lock()
+        self.store.fail_orphans()
+
+    @classmethod
+    def from_env(cls) -> 'TrainingJobRunner':
+        """Build a runner from the TRAINING_* environment variables."""
+        return cls(
+            JobStore(os.getenv('TRAINING_JOBS_DB', 'data/training_jobs.db')),
+            max_workers=int(os.getenv('TRAINING_WORKERS', '1')),
+            niceness=int(os.getenv('TRAINING_NICE', '10')),
+        )
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_lower_priority,
+                    initargs=(self.niceness,)
+                )
+            return self._executor
+
+    def _discard_pool(self, executor: ProcessPoolExecutor):
+        """Drop a broken executor so the next job starts a fresh one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, samples: Sequence[Sample], **kwargs) -> Dict[str, Any]:
+        """Queue a training job over (image path, label, content hash) samples.
+
+        Returns:
+            dict: The new job's row
+
+        Raises:
+            RuntimeError: If the job could not be handed to a worker; the
+                job is recorded as failed
+        """
+        job = self.store.create()
+        args = (run_training_job, job['id'], self.store.db_path, list(samples))
+        try:
+            executor = self._pool()
+            try:
+                future = executor.submit(*args, **kwargs)
+            except BrokenProcessPool:
+                # The previous worker died (e.g. killed for memory); retry
+                # once on a new one
+                self._discard_pool(executor)
+                executor = self._pool()
+                future = executor.submit(*args, **kwargs)
+        except Exception as e:
+            self.store.update(job['id'], status='failed', finished_at=time.time(),
+                              error=f'Could not start training: {e}')
+            raise RuntimeError(f'Could not start training job: {e}') from e
+        future.add_done_callback(lambda done: self._check_crash(job['id'], executor, done))
+        return job
+
+    def _check_crash(self, job_id: str, executor: ProcessPoolExecutor, future):
+        # run_training_job records its own failures; this catches the
+        # worker process dying outright
+        if future.cancelled():
+            self.store.update(job_id, status='failed', finished_at=time.time(), error='Cancelled')
+            return
+        error = future.exception()
+        if error is not None:
+            self.store.update(job_id, status='failed', finished_at=time.time(), error=str(error))
+            if isinstance(error, BrokenProcessPool):
+                self._discard_pool(executor)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,142 @@
+"""Content-addressed store for uploaded training images.
+
+Each file is stored once under the SHA-256 of its content, in a two-level
+directory tree (``ab/cd/abcd…``) so no directory grows past a few hundred
+entries. Uploads are hashed while they are written to a temporary file and
+then renamed into place, so a stored file is always complete and identical
+content is never written twice.
+
+Request handlers never delete stored files, since the same content may be
+referenced by another row; unreferenced files are removed by
+`collect_garbage`.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from typing import IO, Callable, Iterable, List, NamedTuple, Tuple
+
+from ..shared import store_path
+
+CHUNK_SIZE = 1 << 20
+
+
+class StoredFile(NamedTuple):
+    sha256: str
+    path: str
+    size: int
+    # False when the content was already in the store
+    created: bool
+
+
+class UploadStore:
+    """Files keyed by content hash.
+
+    Args:
+        root_dir: Base directory of the store
+    """
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        self.tmp_dir = os.path.join(root_dir, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, sha256: str) -> str:
+        return store_path(self.root_dir, sha256)
+
+    def __contains__(self, sha256: str) -> bool:
+        return os.path.exists(self.path(sha256))
+
+    def put(self, source: IO[bytes]) -> StoredFile:
+        """Copy a stream into the store.
+
+        Args:
+            source: Readable binary file object
+
+        Returns:
+            StoredFile: Hash, path and size of the content, and whether it
+                was newly written
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+
+            sha256 = digest.hexdigest()
+            path = self.path(sha256)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                # Mark the file as recently used so garbage collection
+                # leaves it alone while this upload inserts its row
+                os.utime(path)
+                return StoredFile(sha256, path, size, False)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            return StoredFile(sha256, path, size, True)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def collect_garbage(self, referenced: Callable[[List[str]], Iterable[str]],
+                        min_age: float = 3600, batch_size: int = 500) -> int:
+        """Delete stored files that no row references.
+
+        Files used within the last `min_age` seconds are kept, since an
+        upload may still be about to insert the row for them. Leftover
+        temporary files older than that are removed too.
+
+        Args:
+            referenced: Called with content hashes; returns those that
+                still have a row
+            min_age: Seconds since last use before a file may be deleted
+            batch_size: Hashes checked per `referenced` call
+
+        Returns:
+            int: Number of files deleted
+        """
+        cutoff = time.time() - min_age
+        removed = 0
+        candidates: List[Tuple[str, str]] = []
+
+        def stale(path):
+            try:
+                return os.path.getmtime(path) < cutoff
+            except OSError:
+                return False
+
+        def sweep():
+            nonlocal removed
+            keep = set(referenced([sha256 for sha256, _ in candidates]))
+            for sha256, path in candidates:
+                # Re-check the age: an upload may have reused the file
+                if sha256 not in keep and stale(path):
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass
+            candidates.clear()
+
+        for dirpath, _, filenames in os.walk(self.root_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if dirpath == self.tmp_dir:
+                    if stale(path):
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+                # Only files laid out by the store; anything else under
+                # the root (e.g. older flat uploads) is left alone
+                elif len(name) == 64 and path == self.path(name) and stale(path):
+                    candidates.append((name, path))
+                    if len(candidates) >= batch_size:
+                        sweep()
+        if candidates:
+            sweep()
+        return removed
@@ -0,0 +1,20 @@
+"""Modules shared with the ML service.
+
+The image fetcher, prediction cache, request profiler and upload store
+layout have one implementation, in ml_service/, which the backend imports
+from here. The ML service is deployed from its own directory and cannot
+import backend code, so the shared modules live on its side and use only
+the standard library and httpx. The repository root must therefore be
+present next to the backend when it is deployed.
+"""
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+
+from ml_service.fetcher import FetchError, ImageFetcher
+from ml_service.prediction_cache import PredictionCache
+from ml_service.profiling import PROFILE_HEADER, PROFILE_MODE_HEADER, TRACE_HEADER, RequestProfiler
+from ml_service.upload_paths import store_path
@@ -4,7 +4,10 @@ This script creates and runs the Flask application with the specified configurat
 """
 from app import create_app
 
-app = create_app()
+# Worker processes started with the spawn method (training jobs, feature
+# extraction) import this module as __mp_main__; they must not build an app
+if __name__ != '__mp_main__':
+    app = create_app()
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
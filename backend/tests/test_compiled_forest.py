@@ -0,0 +1,89 @@
+"""CompiledForest must reproduce RandomForestClassifier.predict_proba exactly."""
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from app.services.compiled_forest import CompiledForest
+
+
+def _fit(X, y, **params):
+    forest = RandomForestClassifier(random_state=0, **params)
+    forest.fit(X, y)
+    return forest
+
+
+def _assert_identical(forest, X):
+    compiled = CompiledForest.from_estimator(forest)
+    assert np.array_equal(compiled.predict_proba(X), forest.predict_proba(X))
+    assert np.array_equal(compiled.predict(X), forest.predict(X))
+
+
+def _threshold_rows(forest, X):
+    """Rows with each split feature set exactly to a split threshold."""
+    rows = []
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        for node in np.flatnonzero(tree.children_left != -1)[:20]:
+            row = X[node % len(X)].copy()
+            row[tree.feature[node]] = tree.threshold[node]
+            rows.append(row)
+    return np.array(rows)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('n_classes', [2, 3])
+@pytest.mark.parametrize('params', [
+    {'n_estimators': 10},
+    {'n_estimators': 25, 'max_depth': 4},
+    {'n_estimators': 7, 'min_samples_leaf': 5, 'max_features': None},
+])
+def test_random_forests(seed, n_classes, params):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(300, 12))
+    y = rng.integers(n_classes, size=len(X))
+    forest = _fit(X, y, **params)
+    _assert_identical(forest, rng.normal(size=(200, 12)))
+    _assert_identical(forest, X)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_ties_at_thresholds(seed):
+    # Small integer features, like histogram counts, put many rows exactly
+    # on a split threshold once cast to float32
+    rng = np.random.default_rng(seed)
+    X = rng.integers(0, 6, size=(400, 8)).astype(np.float64)
+    y = (X[:, 0] + X[:, 1] + rng.integers(0, 3, size=len(X)) > 6).astype(int)
+    forest = _fit(X, y, n_estimators=15)
+    _assert_identical(forest, X)
+    _assert_identical(forest, _threshold_rows(forest, X))
+    _assert_identical(forest, np.nextafter(_threshold_rows(forest, X), np.inf))
+
+
+def test_single_node_trees():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(50, 4))
+    y = rng.integers(2, size=len(X))
+    # No split is allowed, so every tree is one leaf
+    forest = _fit(X, y, n_estimators=5, min_samples_split=len(X) + 1)
+    assert all(estimator.tree_.node_count == 1 for estimator in forest.estimators_)
+    _assert_identical(forest, X)
+
+    # One class in the training data also gives single-leaf trees
+    forest = _fit(X, np.zeros(len(X), dtype=int), n_estimators=3)
+    _assert_identical(forest, X)
+
+
+def test_batch_of_one():
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(200, 6))
+    y = rng.integers(2, size=len(X))
+    forest = _fit(X, y, n_estimators=20)
+    for row in X[:10]:
+        _assert_identical(forest, row[np.newaxis, :])
+
+
+def test_rejects_wrong_feature_count():
+    rng = np.random.default_rng(2)
+    forest = _fit(rng.normal(size=(40, 3)), rng.integers(2, size=40), n_estimators=2)
+    with pytest.raises(ValueError):
+        CompiledForest.from_estimator(forest).predict_proba(np.zeros((1, 4)))
@@ -0,0 +1,105 @@
+"""MetadataExtractor must return what the original exifread + PIL version did."""
+from io import BytesIO
+
+import exifread
+import pytest
+from PIL import Image
+from PIL.TiffImagePlugin import IFDRational
+
+from app.services.metadata_extractor import MetadataExtractor
+
+
+def _reference_extract(extractor, image_data):
+    """The extractor before the JPEG header fast path."""
+    try:
+        metadata = {}
+        tags = exifread.process_file(BytesIO(image_data))
+        for tag in extractor.interesting_tags:
+            if tag in tags:
+                metadata[tag.split()[-1]] = str(tags[tag])
+        with Image.open(BytesIO(image_data)) as img:
+            metadata.update({
+                'format': img.format,
+                'mode': img.mode,
+                'size': img.size,
+            })
+        return metadata
+    except Exception:
+        return {}
+
+
+def _exif():
+    exif = Image.Exif()
+    exif[0x010F] = 'Canon'
+    exif[0x0110] = 'EOS 5D'
+    exif[0x0131] = 'Firmware 1.0'
+    exif[0x0132] = '2020:01:02 03:04:05'
+    # Exif sub-IFD
+    exif[0x8769] = {
+        0x9003: '2020:01:02 03:04:05',
+        0x9004: '2020:01:02 03:04:06',
+        0x8827: 400,
+        0x829A: IFDRational(1, 250),
+        0x829D: IFDRational(28, 10),
+        0x8822: 2,
+        0x9000: b'0231',
+    }
+    return exif
+
+
+def _encode(mode, size=(64, 48), fmt='JPEG', **params):
+    image = Image.new(mode, size)
+    image.putdata([tuple((i * 7 + c * 31) % 256 for c in range(len(mode)))
+                   if len(mode) > 1 else (i * 7) % 256
+                   for i in range(size[0] * size[1])])
+    buffer = BytesIO()
+    image.save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+
+SAMPLES = {
+    'rgb_exif': lambda: _encode('RGB', exif=_exif()),
+    'rgb_no_exif': lambda: _encode('RGB'),
+    'grayscale_exif': lambda: _encode('L', exif=_exif()),
+    'grayscale': lambda: _encode('L', (33, 17)),
+    'cmyk': lambda: _encode('CMYK', exif=_exif()),
+    'progressive': lambda: _encode('RGB', (640, 480), progressive=True, exif=_exif()),
+    'progressive_no_exif': lambda: _encode('RGB', (31, 9), progressive=True),
+    'odd_size': lambda: _encode('RGB', (1, 1000)),
+    'png': lambda: _encode('RGB', fmt='PNG'),
+    'png_rgba': lambda: _encode('RGBA', fmt='PNG'),
+    'png_exif': lambda: _encode('RGB', fmt='PNG', exif=_exif()),
+    'empty': lambda: b'',
+    'not_an_image': lambda: b'not an image at all',
+    'jpeg_marker_only': lambda: b'\xff\xd8\xff',
+    'truncated_header': lambda: _encode('RGB', exif=_exif())[:40],
+    'truncated_data': lambda: _encode('RGB', (256, 256))[:-500],
+}
+
+
+@pytest.fixture(scope='module')
+def extractor():
+    return MetadataExtractor()
+
+
+@pytest.mark.parametrize('name', sorted(SAMPLES))
+def test_matches_reference(extractor, name):
+    image_data = SAMPLES[name]()
+    assert extractor.extract(image_data) == _reference_extract(extractor, image_data)
+
+
+def test_exif_tags_are_read(extractor):
+    metadata = extractor.extract(SAMPLES['rgb_exif']())
+    assert metadata['Make'] == 'Canon'
+    assert metadata['DateTimeOriginal'] == '2020:01:02 03:04:05'
+    assert metadata['ExposureTime'] == '1/250'
+    assert metadata['size'] == (64, 48)
+
+
+def test_invalid_input_returns_empty(extractor):
+    assert extractor.extract(b'not an image at all') == {}
+
+
+def test_extract_batch_matches_extract(extractor):
+    images = [SAMPLES[name]() for name in sorted(SAMPLES)]
+    assert extractor.extract_batch(images) == [extractor.extract(data) for data in images]
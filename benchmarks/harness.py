@@ -0,0 +1,173 @@
+"""Timing, environment capture and baseline comparison for the benchmarks."""
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+# Packages whose versions are recorded with every run
+PACKAGES = ("torch", "numpy", "pillow", "opencv-python", "scikit-learn", "exifread")
+
+
+def environment_info() -> Dict[str, object]:
+    """Describe the machine and software a run was measured on."""
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+
+    try:
+        import torch
+        torch_threads = torch.get_num_threads()
+    except ImportError:
+        torch_threads = None
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch_threads,
+        "packages": versions,
+    }
+
+
+def measure(name: str, group: str, fn: Callable[[], object], repeat: int = 20,
+            warmup: int = 3, items: int = 1, params: Optional[dict] = None) -> Dict[str, object]:
+    """Time repeated calls of `fn`.
+
+    Args:
+        name: Unique benchmark name, used to match results against a baseline
+        group: Benchmark group (predict, preprocess, ...)
+        fn: Zero-argument callable doing one unit of work
+        repeat: Number of timed calls
+        warmup: Untimed calls made first (lazy init, caches, allocator)
+        items: Images processed per call, for throughput
+        params: Extra parameters recorded with the result
+
+    Returns:
+        dict: Timings in milliseconds per call, and items per second based
+        on the median
+    """
+    for _ in range(warmup):
+        fn()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        fn()
+        times.append((time.perf_counter_ns() - start) / 1e6)
+
+    times.sort()
+    median = statistics.median(times)
+    return {
+        "name": name,
+        "group": group,
+        "params": params or {},
+        "repeat": repeat,
+        "items": items,
+        "min_ms": times[0],
+        "median_ms": median,
+        "mean_ms": statistics.fmean(times),
+        "p95_ms": times[min(len(times) - 1, int(round(0.95 * (len(times) - 1))))],
+        "stdev_ms": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "items_per_sec": items * 1000.0 / median if median > 0 else None,
+    }
+
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Generate a deterministic photo-like RGB image.
+
+    Smooth gradients with mild noise compress and decode more like real
+    photos than pure noise does.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    channels = []
+    for phase in rng.uniform(0, 2 * np.pi, size=3):
+        wave = np.sin(x / max(width, 1) * 6 + phase) + np.cos(y / max(height, 1) * 4 - phase)
+        channels.append(127.5 + 60 * wave)
+    pixels = np.stack(channels, axis=-1) + rng.normal(0, 8, size=(height, width, 3))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+
+
+def synthetic_jpeg(width: int, height: int, seed: int = 0, quality: int = 90,
+                   exif: bool = True) -> bytes:
+    """Encode `synthetic_image` as JPEG, optionally with camera EXIF tags."""
+    image = synthetic_image(width, height, seed)
+    kwargs = {"quality": quality}
+    if exif:
+        tags = Image.Exif()
+        tags[0x010F] = "BenchCam"             # Make
+        tags[0x0110] = "Model 1"              # Model
+        tags[0x0131] = "benchmarks"           # Software
+        tags[0x0132] = "2024:01:01 12:00:00"  # DateTime
+        kwargs["exif"] = tags.tobytes()
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", **kwargs)
+    return buffer.getvalue()
+
+
+def save_results(path: str, results: dict):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.10) -> List[Dict[str, object]]:
+    """Compare median timings of two runs.
+
+    Args:
+        current: Results of the run being checked
+        baseline: Stored results to compare against
+        threshold: Relative slowdown of the median above which a benchmark
+            is flagged, e.g. 0.10 for 10%
+
+    Returns:
+        list: One entry per benchmark present in both runs, with the ratio
+        current/baseline and whether it counts as a regression
+    """
+    baseline_by_name = {result["name"]: result for result in baseline.get("benchmarks", [])}
+    rows = []
+    for result in current.get("benchmarks", []):
+        reference = baseline_by_name.get(result["name"])
+        if reference is None or not reference["median_ms"]:
+            continue
+        ratio = result["median_ms"] / reference["median_ms"]
+        rows.append({
+            "name": result["name"],
+            "baseline_ms": reference["median_ms"],
+            "current_ms": result["median_ms"],
+            "ratio": ratio,
+            "regression": ratio > 1.0 + threshold,
+        })
+    return rows
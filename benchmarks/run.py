@@ -0,0 +1,297 @@
+"""Benchmarks for the inference, preprocessing and feature extraction paths.
+
+Runs every benchmark group on generated synthetic images plus the checked-in
+test images, prints a summary and writes the results as JSON:
+
+    python benchmarks/run.py --output benchmarks/results/latest.json
+
+Compare against a stored baseline, either while running or for two saved
+result files; the exit status is 1 if any benchmark regressed:
+
+    python benchmarks/run.py --baseline benchmarks/results/baseline.json
+    python benchmarks/run.py --results new.json --baseline baseline.json
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from harness import (compare, environment_info, load_results, measure, save_results,
+                     synthetic_image, synthetic_jpeg)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_IMAGE_GLOBS = (
+    os.path.join(REPO_ROOT, "test_images", "*.jpg"),
+    os.path.join(REPO_ROOT, "ml_service", "test_images", "*.jpg"),
+)
+GROUPS = ("predict", "batch", "preprocess", "features", "analyze", "metadata")
+
+# Both services are laid out as scripts rather than installed packages
+sys.path.insert(0, os.path.join(REPO_ROOT, "ml_service"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "backend"))
+
+
+def load_inputs(image_sizes):
+    """Encoded images to benchmark with, keyed by a short name."""
+    inputs = {}
+    for width, height in image_sizes:
+        inputs[f"synthetic_{width}x{height}"] = synthetic_jpeg(width, height, seed=width * height)
+    for pattern in TEST_IMAGE_GLOBS:
+        for path in sorted(glob.glob(pattern)):
+            name = os.path.relpath(path, REPO_ROOT).replace(os.sep, "/")
+            with open(path, "rb") as f:
+                inputs[name] = f.read()
+    return inputs
+
+
+def bench_predict(args, inputs):
+    """ImageClassifier.predict latency and predict_arrays throughput."""
+    from model import ImageClassifier, build_model, save_model
+
+    results = []
+    image_data = inputs[next(iter(inputs))]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for input_size in args.input_sizes:
+            # Randomly initialized weights, loaded from disk so predictions
+            # run the network instead of the untrained heuristic
+            model_path = os.path.join(tmp_dir, f"{args.arch}_{input_size}.pt")
+            save_model(build_model(args.arch, input_size=input_size), model_path)
+            classifier = ImageClassifier(model_path=model_path, model_format="state_dict",
+                                         arch=args.arch, model_config={"input_size": input_size})
+            params = {"arch": args.arch, "input_size": input_size}
+
+            if "predict" in args.groups:
+                results.append(measure(
+                    f"predict/{args.arch}/{input_size}", "predict",
+                    lambda: classifier.predict(Image.open(io.BytesIO(image_data))),
+                    repeat=args.repeat, warmup=args.warmup, params=params
+                ))
+
+            if "batch" in args.groups:
+                array = classifier.preprocessor.to_array(Image.open(io.BytesIO(image_data)))
+                for batch_size in args.batch_sizes:
+                    arrays = np.stack([array] * batch_size)
+                    results.append(measure(
+                        f"batch/{args.arch}/{input_size}/{batch_size}", "batch",
+                        lambda arrays=arrays: classifier.predict_arrays(arrays),
+                        repeat=args.repeat, warmup=args.warmup, items=batch_size,
+                        params=dict(params, batch_size=batch_size)
+                    ))
+    return results
+
+
+def bench_preprocess(args, inputs):
+    """Decode + resize per image (full and draft decode) and batch normalization."""
+    from preprocessing import Preprocessor
+
+    results = []
+    for fast_decode in (False, True):
+        preprocessor = Preprocessor(fast_decode=fast_decode)
+        mode = "draft" if fast_decode else "full"
+        for name, image_data in inputs.items():
+            results.append(measure(
+                f"preprocess/to_array/{mode}/{name}", "preprocess",
+                lambda image_data=image_data: preprocessor.to_array(Image.open(io.BytesIO(image_data))),
+                repeat=args.repeat, warmup=args.warmup,
+                params={"fast_decode": fast_decode, "image": name}
+            ))
+
+    preprocessor = Preprocessor()
+    height, width = preprocessor.size
+    for batch_size in args.batch_sizes:
+        arrays = np.stack([np.asarray(synthetic_image(width, height, seed))
+                           for seed in range(batch_size)])
+        results.append(measure(
+            f"preprocess/normalize/{batch_size}", "preprocess",
+            lambda arrays=arrays: preprocessor.normalize(arrays),
+            repeat=args.repeat, warmup=args.warmup, items=batch_size,
+            params={"batch_size": batch_size}
+        ))
+    return results
+
+
+def _trained_processor(seed: int = 0):
+    """ImageProcessor fitted on synthetic images so analyze takes the model path."""
+    from app.services.image_processor import ImageProcessor
+
+    # Keep the fitted model and feature store out of the working directory
+    state_dir = tempfile.mkdtemp(prefix="bench-processor-")
+    processor = ImageProcessor(model_path=os.path.join(state_dir, "model.joblib"),
+                               feature_store_dir=os.path.join(state_dir, "features"))
+    width, height = processor.image_size
+    images = [np.asarray(synthetic_image(width, height, seed + i)) for i in range(20)]
+    processor.train(images, [i % 2 for i in range(len(images))])
+    return processor
+
+
+def bench_features(args, inputs):
+    """ImageProcessor.extract_features on preprocessed images."""
+    processor = _trained_processor()
+    results = []
+    for name, image_data in inputs.items():
+        image_array = processor.preprocess_image(image_data)
+        results.append(measure(
+            f"features/extract/{name}", "features",
+            lambda image_array=image_array: processor.extract_features(image_array),
+            repeat=args.repeat, warmup=args.warmup, params={"image": name}
+        ))
+    return results
+
+
+def bench_analyze(args, inputs):
+    """ImageProcessor.analyze end to end, and the forest on its own."""
+    processor = _trained_processor()
+    results = [
+        measure(
+            f"analyze/{name}", "analyze",
+            lambda image_data=image_data: processor.analyze(image_data),
+            repeat=args.repeat, warmup=args.warmup, params={"image": name}
+        )
+        for name, image_data in inputs.items()
+    ]
+
+    features = processor.extract_features(processor.preprocess_image(next(iter(inputs.values()))))
+    for batch_size in args.batch_sizes:
+        rows = np.repeat(features[np.newaxis], batch_size, axis=0)
+        for kind, predict_proba in (("sklearn", processor.model.predict_proba),
+                                    ("compiled", processor.predictor.predict_proba)):
+            results.append(measure(
+                f"analyze/forest/{kind}/{batch_size}", "analyze",
+                lambda rows=rows, predict_proba=predict_proba: predict_proba(rows),
+                repeat=args.repeat, warmup=args.warmup, items=batch_size,
+                params={"predictor": kind, "batch_size": batch_size}
+            ))
+    return results
+
+
+def bench_metadata(args, inputs):
+    """MetadataExtractor.extract and extract_batch (EXIF plus basic image info)."""
+    from app.services.metadata_extractor import MetadataExtractor
+
+    extractor = MetadataExtractor()
+    results = [
+        measure(
+            f"metadata/{name}", "metadata",
+            lambda image_data=image_data: extractor.extract(image_data),
+            repeat=args.repeat, warmup=args.warmup, params={"image": name}
+        )
+        for name, image_data in inputs.items()
+    ]
+
+    images_data = list(inputs.values())
+    for batch_size in args.batch_sizes:
+        batch = [images_data[i % len(images_data)] for i in range(batch_size)]
+        results.append(measure(
+            f"metadata/batch/{batch_size}", "metadata",
+            lambda batch=batch: extractor.extract_batch(batch),
+            repeat=args.repeat, warmup=args.warmup, items=batch_size,
+            params={"batch_size": batch_size}
+        ))
+    return results
+
+
+def run(args) -> dict:
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    inputs = load_inputs(args.image_sizes)
+    benchmarks = []
+    if "predict" in args.groups or "batch" in args.groups:
+        benchmarks.extend(bench_predict(args, inputs))
+    if "preprocess" in args.groups:
+        benchmarks.extend(bench_preprocess(args, inputs))
+    if "features" in args.groups:
+        benchmarks.extend(bench_features(args, inputs))
+    if "analyze" in args.groups:
+        benchmarks.extend(bench_analyze(args, inputs))
+    if "metadata" in args.groups:
+        benchmarks.extend(bench_metadata(args, inputs))
+
+    return {
+        "environment": environment_info(),
+        "settings": {
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "groups": list(args.groups),
+            "input_sizes": args.input_sizes,
+            "batch_sizes": args.batch_sizes,
+            "image_sizes": [list(size) for size in args.image_sizes],
+        },
+        "benchmarks": benchmarks,
+    }
+
+
+def print_results(results: dict):
+    print(f"{'benchmark':<64} {'median ms':>10} {'p95 ms':>10} {'items/s':>10}")
+    for result in results["benchmarks"]:
+        print(f"{result['name']:<64} {result['median_ms']:>10.3f} {result['p95_ms']:>10.3f} "
+              f"{result['items_per_sec'] or 0:>10.1f}")
+
+
+def print_comparison(rows, threshold: float) -> int:
+    print(f"\n{'benchmark':<64} {'baseline':>10} {'current':>10} {'change':>8}")
+    regressions = 0
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        regressions += row["regression"]
+        print(f"{row['name']:<64} {row['baseline_ms']:>10.3f} {row['current_ms']:>10.3f} "
+              f"{(row['ratio'] - 1) * 100:>+7.1f}%{flag}")
+    print(f"\n{regressions} of {len(rows)} benchmarks slower than baseline by more than {threshold:.0%}")
+    return regressions
+
+
+def _image_size(value: str):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inference and feature extraction")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Write results as JSON to this path")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="Baseline results JSON to compare against")
+    parser.add_argument("--results", type=str, default=None,
+                        help="Compare an existing results JSON instead of running")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative median slowdown flagged as a regression")
+    parser.add_argument("--groups", type=str, nargs="+", default=list(GROUPS), choices=GROUPS,
+                        help="Benchmark groups to run")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per benchmark")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed calls per benchmark")
+    parser.add_argument("--arch", type=str, default="simple_cnn", help="Model architecture")
+    parser.add_argument("--input_sizes", type=int, nargs="+", default=[128, 224, 320],
+                        help="Model input resolutions for the predict benchmarks")
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 8, 32],
+                        help="Batch sizes for the throughput benchmarks")
+    parser.add_argument("--image_sizes", type=_image_size, nargs="+",
+                        default=[(640, 480), (1920, 1080), (4000, 3000)],
+                        help="Synthetic source image sizes as WIDTHxHEIGHT")
+    parser.add_argument("--threads", type=int, default=None, help="Torch intra-op threads")
+    args = parser.parse_args()
+
+    if args.results:
+        results = load_results(args.results)
+    else:
+        results = run(args)
+        print_results(results)
+        if args.output:
+            save_results(args.output, results)
+            print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        rows = compare(results, load_results(args.baseline), args.threshold)
+        if print_comparison(rows, args.threshold):
+            sys.exit(1)
+    elif args.results:
+        parser.error("--results requires --baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Dynamic micro-batching of inference requests."""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the batching queue cannot accept more requests."""
+
+
+class MicroBatcher:
+    """Collect concurrent requests into batches for a single forward pass.
+
+    Requests are queued in-process. A background task takes the first queued
+    item, then keeps collecting until either `max_batch_size` items are
+    gathered or `max_wait_ms` has elapsed, and hands the whole batch to
+    `runner` on a worker thread so the event loop keeps accepting requests
+    while the model runs. Up to `max_concurrency` batches run at once (one
+    per inference worker process, for example), and the next batch only
+    starts forming once a runner is free. Each caller receives the result
+    at its own position in the batch.
+
+    Args:
+        runner: Callable taking a list of items and returning a list of
+            results in the same order
+        max_batch_size: Maximum number of items per batch
+        max_wait_ms: Maximum time to wait for a batch to fill after the
+            first item arrives
+        max_queue_size: Maximum number of pending items before new requests
+            are rejected
+        max_concurrency: Maximum number of batches running at once
+    """
+    def __init__(self, runner: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 max_queue_size: int = 1024, max_concurrency: int = 1):
+        self.runner = runner
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue_size = max_queue_size
+        self.max_concurrency = max(1, max_concurrency)
+
+        self._queue = None
+        self._worker = None
+        # Bounded threads keep in-process forward passes from competing for cores
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix="batcher")
+        self._running = 0
+
+        self._batches = 0
+        self._items = 0
+        self._last_batch_size = 0
+        self._max_batch_seen = 0
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+        self._total_run = 0.0
+
+    def _ensure_started(self):
+        """Start the batching task on the running event loop if needed."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for its result.
+
+        Args:
+            item: Input for the runner
+
+        Returns:
+            The runner's result for this item
+
+        Raises:
+            QueueFullError: If the queue already holds `max_queue_size` items
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            raise QueueFullError("Inference queue is full")
+        return await future
+
+    async def _collect(self) -> list:
+        """Wait for the next batch of queued entries."""
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        # Take anything that is already waiting without delaying further
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        """Background loop that forms batches and starts them."""
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.max_concurrency)
+        while True:
+            await slots.acquire()
+            batch = await self._collect()
+
+            # Drop requests whose callers have gone away
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                slots.release()
+                continue
+
+            task = loop.create_task(self._run_batch(batch))
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _run_batch(self, batch: list):
+        """Run one batch on the executor and resolve its callers' futures."""
+        loop = asyncio.get_running_loop()
+        items = [entry[0] for entry in batch]
+        started = time.perf_counter()
+        self._running += 1
+        try:
+            results = await loop.run_in_executor(self._executor, self.runner, items)
+        except Exception as e:
+            logging.error(f"Batch of {len(items)} failed: {str(e)}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._running -= 1
+        finished = time.perf_counter()
+
+        for (_, future, enqueued), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+            wait = started - enqueued
+            self._total_wait += wait
+            self._max_wait_seen = max(self._max_wait_seen, wait)
+
+        self._batches += 1
+        self._items += len(items)
+        self._last_batch_size = len(items)
+        self._max_batch_seen = max(self._max_batch_seen, len(items))
+        self._total_run += finished - started
+        logging.debug(f"Ran batch of {len(items)} in {(finished - started) * 1000:.1f} ms")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return batching configuration and counters.
+
+        Returns:
+            dict: Configured limits, current queue depth, batch sizes and
+            average/maximum queue wait and run time in milliseconds
+        """
+        batches = self._batches or 1
+        items = self._items or 1
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_queue_size": self.max_queue_size,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "running_batches": self._running,
+            "batches": self._batches,
+            "items": self._items,
+            "last_batch_size": self._last_batch_size,
+            "max_batch_size_seen": self._max_batch_seen,
+            "avg_batch_size": self._items / batches,
+            "avg_queue_wait_ms": self._total_wait / items * 1000.0,
+            "max_queue_wait_ms": self._max_wait_seen * 1000.0,
+            "avg_batch_run_ms": self._total_run / batches * 1000.0,
+        }
@@ -0,0 +1,216 @@
+"""Resumable training checkpoints written off the training thread."""
+import glob
+import logging
+import os
+import random
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+import torch
+
+LATEST_FILE = "latest"
+LATEST_RUN_FILE = "latest_run"
+CHECKPOINT_PATTERN = "checkpoint_{:04d}.pt"
+
+
+def snapshot(obj: Any) -> Any:
+    """Deep-copy a (nested) state dict with every tensor cloned to CPU.
+
+    Taking the snapshot is a memory copy, after which training can keep
+    updating the live tensors while the copy is written to disk.
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return type(obj)((key, snapshot(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(value) for value in obj)
+    return obj
+
+
+def capture_rng_state() -> Dict[str, Any]:
+    """Capture the Python, NumPy and torch random generator states."""
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng_state(state: Dict[str, Any]):
+    """Restore generator states captured by `capture_rng_state`."""
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def atomic_save(obj: Any, path: str):
+    """Write with torch.save to a temporary file and rename it into place."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    torch.save(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_pointer(path: str, value: str):
+    with open(path + ".tmp", "w") as f:
+        f.write(value)
+    os.replace(path + ".tmp", path)
+
+
+def start_run(checkpoint_root: str, run_name: str) -> str:
+    """Create the checkpoint directory for a new training run.
+
+    Every run gets its own directory under `checkpoint_root`, which records
+    the most recent one for `latest_checkpoint`.
+
+    Returns:
+        str: The run's checkpoint directory
+    """
+    run_dir = os.path.join(checkpoint_root, run_name)
+    os.makedirs(run_dir, exist_ok=True)
+    _write_pointer(os.path.join(checkpoint_root, LATEST_RUN_FILE), run_name)
+    return run_dir
+
+
+def latest_checkpoint(checkpoint_dir: str) -> Optional[str]:
+    """Return the newest complete checkpoint in a directory, if any.
+
+    For a directory of runs created with `start_run`, only the most recent
+    run is searched, so an older run is never resumed by mistake.
+    """
+    run_pointer = os.path.join(checkpoint_dir, LATEST_RUN_FILE)
+    if os.path.exists(run_pointer):
+        with open(run_pointer) as f:
+            return latest_checkpoint(os.path.join(checkpoint_dir, f.read().strip()))
+
+    pointer = os.path.join(checkpoint_dir, LATEST_FILE)
+    if os.path.exists(pointer):
+        with open(pointer) as f:
+            path = os.path.join(checkpoint_dir, f.read().strip())
+        if os.path.exists(path):
+            return path
+
+    checkpoints = sorted(glob.glob(os.path.join(checkpoint_dir, "checkpoint_*.pt")))
+    return checkpoints[-1] if checkpoints else None
+
+
+def load_checkpoint(path: str, map_location=None) -> Dict[str, Any]:
+    """Load a training checkpoint written by `AsyncCheckpointWriter`."""
+    return torch.load(path, map_location=map_location, weights_only=False)
+
+
+class AsyncCheckpointWriter:
+    """Write checkpoints from a background thread.
+
+    `write` snapshots the state to CPU memory and returns; a daemon thread
+    serializes it to a temporary file and atomically renames it into place,
+    so the training loop never waits on disk. If a newer state for the same
+    path arrives before the previous one was written, only the newer one is
+    written.
+
+    Epoch checkpoints saved with `save_epoch` are named
+    ``checkpoint_<epoch>.pt``; the `latest` file points at the newest one.
+    Of the checkpoints this writer saved, only the last `keep` are
+    retained; files it did not write are never deleted.
+
+    Args:
+        checkpoint_dir: Directory for epoch checkpoints
+        keep: Number of epoch checkpoints to keep
+    """
+    def __init__(self, checkpoint_dir: Optional[str] = None, keep: int = 3):
+        self.checkpoint_dir = checkpoint_dir
+        self.keep = keep
+        self._saved = []
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, path: str, state: Dict[str, Any], on_written=None):
+        """Queue `state` to be saved at `path`.
+
+        Args:
+            path: Destination file
+            state: State to save; tensors are snapshotted before returning
+            on_written: Optional callback run on the writer thread after
+                the file is in place
+        """
+        if self._error is not None:
+            raise RuntimeError(f"Checkpoint writer failed: {self._error}")
+        state = snapshot(state)
+        with self._condition:
+            self._pending.pop(path, None)
+            self._pending[path] = (state, on_written)
+            self._condition.notify_all()
+
+    def save_epoch(self, epoch: int, state: Dict[str, Any]):
+        """Queue a full training checkpoint for `epoch`."""
+        name = CHECKPOINT_PATTERN.format(epoch)
+        path = os.path.join(self.checkpoint_dir, name)
+        self.write(path, state, on_written=lambda: self._publish(name))
+
+    def _publish(self, name: str):
+        """Point `latest` at a written checkpoint and prune old ones."""
+        _write_pointer(os.path.join(self.checkpoint_dir, LATEST_FILE), name)
+
+        if name in self._saved:
+            self._saved.remove(name)
+        self._saved.append(name)
+        if self.keep <= 0:
+            return
+        stale, self._saved = self._saved[:-self.keep], self._saved[-self.keep:]
+        for old_name in stale:
+            try:
+                os.remove(os.path.join(self.checkpoint_dir, old_name))
+            except OSError:
+                pass
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending and self._closed:
+                    return
+                path, (state, on_written) = self._pending.popitem(last=False)
+                self._busy = True
+            try:
+                atomic_save(state, path)
+                if on_written is not None:
+                    on_written()
+            except Exception as e:
+                logging.error(f"Error writing checkpoint {path}: {str(e)}")
+                self._error = e
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def flush(self):
+        """Block until every queued checkpoint has been written."""
+        with self._condition:
+            while self._pending or self._busy:
+                self._condition.wait()
+        if self._error is not None:
+            raise RuntimeError(f"Checkpoint writer failed: {self._error}")
+
+    def close(self):
+        """Write outstanding checkpoints and stop the writer thread."""
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
@@ -1,27 +1,41 @@
 """Data loading and preprocessing utilities for fake news image detection."""
 import os
-from typing import Tuple
+from typing import List, Optional, Tuple
 
 import torch
 from torch.utils.data import Dataset, DataLoader
-from torchvision import transforms
+from torch.utils.data.distributed import DistributedSampler
 from PIL import Image
 
+from preprocessing import Preprocessor
+from dataset_cache import DecodedImageCache
+from streaming_dataset import ShardedImageDataset
+from distributed import barrier, is_distributed, is_main_process
+
 class FakeNewsDataset(Dataset):
     """Dataset for fake news image detection.
     
+    Unless a custom transform is given, images are preprocessed with the
+    same `Preprocessor` as ImageClassifier.
+    With `raw=True` samples are returned as uint8 HWC arrays and
+    normalization is left to `preprocessor.collate`, which handles a whole
+    batch in one vectorized pass.
+    
     Args:
         root_dir: Root directory containing 'real' and 'fake' subdirectories
         transform: Optional transform to be applied on images
+        raw: Return resized uint8 arrays instead of normalized tensors
+        image_size: Side length images are resized to
+        cache_dir: Optional directory for a `DecodedImageCache`, so each
+            image is decoded once and later epochs read a memory-mapped
+            shard (ignored with a custom transform)
     """
-    def __init__(self, root_dir: str, transform=None):
+    def __init__(self, root_dir: str, transform=None, raw: bool = False, image_size: int = 224,
+                 cache_dir: Optional[str] = None):
         self.root_dir = root_dir
-        self.transform = transform or transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                              std=[0.229, 0.224, 0.225])
-        ])
+        self.transform = transform
+        self.preprocessor = Preprocessor((image_size, image_size))
+        self.raw = raw and transform is None
         
         # Load all image paths and labels
         self.data = []
@@ -45,6 +59,17 @@ class FakeNewsDataset(Dataset):
                         os.path.join(fake_dir, img_name),
                         1  # Fake label
                     ))
+        
+        # Decode everything once into the memory-mapped cache; with several
+        # processes the main one builds it and the others reuse it
+        self.cache = None
+        if cache_dir and transform is None:
+            self.cache = DecodedImageCache(cache_dir, image_size)
+            if not is_main_process():
+                barrier()
+            self.cache.sync(self.data, self.preprocessor)
+            if is_main_process():
+                barrier()
     
     def __len__(self) -> int:
         return len(self.data)
@@ -52,50 +77,151 @@ class FakeNewsDataset(Dataset):
     def __getitem__(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor]:
         img_path, label = self.data[idx]
         
+        label = torch.tensor([label], dtype=torch.float32)
+        if self.cache is not None:
+            image = self.cache[idx]
+            return (image if self.raw else self.preprocessor.normalize([image])[0]), label
+        
         # Load and transform image
-        image = Image.open(img_path).convert('RGB')
+        image = Image.open(img_path)
         if self.transform:
-            image = self.transform(image)
+            image = self.transform(image.convert('RGB'))
+        elif self.raw:
+            image = self.preprocessor.to_array(image)
+        else:
+            image = self.preprocessor(image)
         
-        return image, torch.tensor([label], dtype=torch.float32)
+        return image, label
 
-def get_data_loaders(data_dir: str, batch_size: int = 32, train_split: float = 0.8):
+def get_streaming_data_loaders(shards: Optional[List[str]] = None, manifest: Optional[str] = None,
+                               training_db: Optional[str] = None, upload_store: Optional[str] = None,
+                               batch_size: int = 32, train_split: float = 0.8,
+                               image_size: int = 224, shuffle_buffer: int = 1000,
+                               num_workers: int = 2, seed: int = 0):
+    """Create training and validation loaders that stream from shards, a
+    manifest or the backend's training database.
+    
+    Samples are split between training and validation by a hash of their
+    key, so the split is stable without listing the corpus.
+    
+    Args:
+        shards: Tar shard paths
+        manifest: Manifest file (used when no shards are given)
+        training_db: Backend SQLite database (used when neither is given)
+        upload_store: Backend upload store directory for `training_db`
+        batch_size: Batch size for data loaders
+        train_split: Fraction of data to use for training
+        image_size: Side length images are resized to
+        shuffle_buffer: Samples held for shuffling the training stream
+        num_workers: DataLoader worker processes
+        seed: Base random seed for shuffling
+        
+    Returns:
+        tuple: (train_loader, val_loader)
+    """
+    common = dict(shards=shards, manifest=manifest, training_db=training_db,
+                  upload_store=upload_store, image_size=image_size,
+                  train_split=train_split, seed=seed)
+    train_dataset = ShardedImageDataset(split='train', shuffle_buffer=shuffle_buffer, **common)
+    val_dataset = ShardedImageDataset(split='val', shuffle_buffer=0, **common)
+    
+    train_loader = DataLoader(
+        train_dataset,
+        batch_size=batch_size,
+        num_workers=num_workers,
+        pin_memory=True,
+        collate_fn=train_dataset.preprocessor.collate
+    )
+    
+    val_loader = DataLoader(
+        val_dataset,
+        batch_size=batch_size,
+        num_workers=num_workers,
+        pin_memory=True,
+        collate_fn=val_dataset.preprocessor.collate
+    )
+    
+    return train_loader, val_loader
+
+def get_data_loaders(data_dir: Optional[str] = None, batch_size: int = 32, train_split: float = 0.8,
+                     image_size: int = 224, cache_dir: Optional[str] = None,
+                     shards: Optional[List[str]] = None, manifest: Optional[str] = None,
+                     training_db: Optional[str] = None, upload_store: Optional[str] = None,
+                     shuffle_buffer: int = 1000, seed: int = 42):
     """Create training and validation data loaders.
     
     Args:
         data_dir: Directory containing 'real' and 'fake' subdirectories
         batch_size: Batch size for data loaders
         train_split: Fraction of data to use for training
+        image_size: Side length images are resized to
+        cache_dir: Optional directory for the decoded image cache
+        shards: Tar shards to stream from instead of `data_dir`
+        manifest: Manifest file to stream from instead of `data_dir`
+        training_db: Backend training database to stream from instead of
+            `data_dir`
+        upload_store: Backend upload store directory for `training_db`
+        shuffle_buffer: Shuffle buffer size when streaming
+        seed: Seed for the train/validation split, so resumed runs see the
+            same split
+        
+    When a torch.distributed process group is active, each rank gets a
+    disjoint shard of both splits through DistributedSampler (streaming
+    datasets split their shards by rank instead).
         
     Returns:
         tuple: (train_loader, val_loader)
     """
-    # Create dataset
-    dataset = FakeNewsDataset(data_dir)
+    if shards or manifest or training_db:
+        return get_streaming_data_loaders(
+            shards=shards,
+            manifest=manifest,
+            training_db=training_db,
+            upload_store=upload_store,
+            batch_size=batch_size,
+            train_split=train_split,
+            image_size=image_size,
+            shuffle_buffer=shuffle_buffer,
+            seed=seed
+        )
+    
+    # Create dataset; normalization happens per batch in the collate function
+    dataset = FakeNewsDataset(data_dir, raw=True, image_size=image_size, cache_dir=cache_dir)
     
     # Split into train and validation
     train_size = int(train_split * len(dataset))
     val_size = len(dataset) - train_size
     
     train_dataset, val_dataset = torch.utils.data.random_split(
-        dataset, [train_size, val_size]
+        dataset, [train_size, val_size],
+        generator=torch.Generator().manual_seed(seed)
     )
     
+    # Give each distributed rank its own part of the data
+    train_sampler = val_sampler = None
+    if is_distributed():
+        train_sampler = DistributedSampler(train_dataset, shuffle=True, seed=seed)
+        val_sampler = DistributedSampler(val_dataset, shuffle=False)
+    
     # Create data loaders
     train_loader = DataLoader(
         train_dataset,
         batch_size=batch_size,
-        shuffle=True,
+        shuffle=train_sampler is None,
+        sampler=train_sampler,
         num_workers=2,
-        pin_memory=True
+        pin_memory=True,
+        collate_fn=dataset.preprocessor.collate
     )
     
     val_loader = DataLoader(
         val_dataset,
         batch_size=batch_size,
         shuffle=False,
+        sampler=val_sampler,
         num_workers=2,
-        pin_memory=True
+        pin_memory=True,
+        collate_fn=dataset.preprocessor.collate
     )
     
     return train_loader, val_loader
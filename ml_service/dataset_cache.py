@@ -0,0 +1,131 @@
+"""Memory-mapped cache of decoded training images."""
+import json
+import logging
+import os
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+INDEX_FILE = "index.json"
+SHARD_FILE = "images.npy"
+CACHE_VERSION = 1
+
+
+class DecodedImageCache:
+    """Decode each training image once into a memory-mapped uint8 shard.
+
+    The shard is an (N, H, W, 3) uint8 `.npy` file with rows in dataset
+    order; `index.json` maps each source path to its row together with the
+    file's size and mtime. `sync` reuses rows whose source file is
+    unchanged, decodes only new or modified files, and rewrites the shard
+    atomically when anything changed. Reads go through `np.load(...,
+    mmap_mode='r')`, so later epochs and runs cost a page-cache copy
+    instead of a JPEG decode.
+
+    The memory map is opened lazily in each process, which keeps the cache
+    cheap to send to DataLoader workers.
+
+    Args:
+        cache_dir: Directory holding the shard and index
+        image_size: Side length of the cached images
+    """
+    def __init__(self, cache_dir: str, image_size: int = 224):
+        self.cache_dir = cache_dir
+        self.image_size = image_size
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        self.shard_path = os.path.join(cache_dir, SHARD_FILE)
+        self._images = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+    @staticmethod
+    def _stat_key(path: str) -> Tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _load_index(self) -> dict:
+        if not (os.path.exists(self.index_path) and os.path.exists(self.shard_path)):
+            return {}
+        with open(self.index_path) as f:
+            index = json.load(f)
+        if index.get("version") != CACHE_VERSION or index.get("image_size") != self.image_size:
+            return {}
+        return index.get("entries", {})
+
+    def sync(self, samples: List[Tuple[str, int]], preprocessor) -> int:
+        """Bring the cache in line with the dataset's samples.
+
+        Args:
+            samples: (image path, label) pairs in dataset order
+            preprocessor: Preprocessor producing uint8 arrays of the cached size
+
+        Returns:
+            int: Number of images that had to be decoded
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = self._load_index()
+        paths = [path for path, _ in samples]
+        stats = [self._stat_key(path) for path in paths]
+
+        reusable = {}
+        for path, (size, mtime_ns) in zip(paths, stats):
+            entry = entries.get(path)
+            if entry and entry["size"] == size and entry["mtime_ns"] == mtime_ns:
+                reusable[path] = entry["row"]
+
+        unchanged = (
+            len(reusable) == len(paths) == len(entries)
+            and all(reusable[path] == row for row, path in enumerate(paths))
+        )
+        if unchanged:
+            self._images = None
+            return 0
+
+        old_images = np.load(self.shard_path, mmap_mode="r") if reusable else None
+        tmp_shard = self.shard_path + ".tmp.npy"
+        shape = (len(paths), self.image_size, self.image_size, 3)
+        images = np.lib.format.open_memmap(tmp_shard, mode="w+", dtype=np.uint8, shape=shape)
+
+        decoded = 0
+        new_entries = {}
+        for row, (path, (size, mtime_ns)) in enumerate(zip(paths, stats)):
+            if path in reusable:
+                images[row] = old_images[reusable[path]]
+            else:
+                with Image.open(path) as image:
+                    images[row] = preprocessor.to_array(image)
+                decoded += 1
+            new_entries[path] = {"row": row, "size": size, "mtime_ns": mtime_ns}
+
+        images.flush()
+        del images, old_images
+        os.replace(tmp_shard, self.shard_path)
+
+        tmp_index = self.index_path + ".tmp"
+        with open(tmp_index, "w") as f:
+            json.dump({
+                "version": CACHE_VERSION,
+                "image_size": self.image_size,
+                "entries": new_entries
+            }, f)
+        os.replace(tmp_index, self.index_path)
+
+        self._images = None
+        logging.info(f"Image cache {self.cache_dir}: decoded {decoded}, reused {len(paths) - decoded}")
+        return decoded
+
+    def __len__(self) -> int:
+        return len(self._mapped())
+
+    def _mapped(self) -> np.ndarray:
+        if self._images is None:
+            self._images = np.load(self.shard_path, mmap_mode="r")
+        return self._images
+
+    def __getitem__(self, row: int) -> np.ndarray:
+        """Return a writable copy of one cached image as a uint8 HWC array."""
+        return np.array(self._mapped()[row])
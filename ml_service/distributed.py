@@ -0,0 +1,80 @@
+"""Helpers for data-parallel training with torch.distributed.
+
+Processes are started by torchrun, which sets RANK, WORLD_SIZE,
+LOCAL_RANK, MASTER_ADDR and MASTER_PORT. For example, four CPU processes
+on one machine:
+
+    torchrun --standalone --nproc_per_node=4 train.py --distributed --data_dir data
+
+or two machines with two processes each (run on both, with node_rank 0/1):
+
+    torchrun --nnodes=2 --nproc_per_node=2 --node_rank=0 \
+        --master_addr=10.0.0.1 --master_port=29500 \
+        train.py --distributed --data_dir data
+"""
+import os
+
+import torch
+import torch.distributed as dist
+
+
+def init_distributed(backend: str = "gloo") -> bool:
+    """Join the process group described by torchrun's environment.
+
+    Args:
+        backend: Process group backend; gloo works on CPU-only machines
+
+    Returns:
+        bool: True if running with more than one process
+    """
+    if dist.is_available() and dist.is_initialized():
+        return True
+    if int(os.getenv("WORLD_SIZE", "1")) <= 1 or not dist.is_available():
+        return False
+
+    local_rank = int(os.getenv("LOCAL_RANK", "0"))
+    if torch.cuda.is_available():
+        torch.cuda.set_device(local_rank)
+
+    dist.init_process_group(backend=backend)
+    # Split the cores between the processes sharing this machine
+    local_world = int(os.getenv("LOCAL_WORLD_SIZE", "1"))
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world))
+    return True
+
+
+def is_distributed() -> bool:
+    """Whether a multi-process group is active."""
+    return dist.is_available() and dist.is_initialized() and dist.get_world_size() > 1
+
+
+def get_rank() -> int:
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size() -> int:
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process() -> bool:
+    """Whether this process handles logging and checkpointing."""
+    return get_rank() == 0
+
+
+def all_reduce_sum(tensor: torch.Tensor) -> torch.Tensor:
+    """Sum a tensor over all processes in place (no-op when not distributed)."""
+    if is_distributed():
+        dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor
+
+
+def barrier():
+    """Wait for every process (no-op when not distributed)."""
+    if is_distributed():
+        dist.barrier()
+
+
+def cleanup():
+    """Leave the process group."""
+    if dist.is_available() and dist.is_initialized():
+        dist.destroy_process_group()
@@ -0,0 +1,157 @@
+"""Export a trained model for CPU serving.
+
+Writes an int8 dynamically quantized TorchScript module that ImageClassifier
+loads with MODEL_FORMAT=torchscript, after checking its outputs against the
+float model.
+
+Example:
+    python export.py --model_path models/fake_detector.pt \
+        --output models/fake_detector_int8.ts --data_dir data
+"""
+import argparse
+import json
+import sys
+
+import torch
+import torch.nn as nn
+
+from model import ImageClassifier, quantize_model
+
+
+def export_torchscript(model: nn.Module, output_path: str, quantize: bool = True) -> nn.Module:
+    """Serialize a model to TorchScript, optionally quantizing it first.
+
+    The architecture name and config are stored alongside the module so
+    ImageClassifier preprocesses inputs at the right resolution.
+
+    Args:
+        model: Trained float model from the model registry
+        output_path: Where to write the TorchScript module
+        quantize: Apply int8 dynamic quantization before tracing
+
+    Returns:
+        The traced module
+    """
+    model = model.to("cpu").eval()
+    metadata = json.dumps({"arch": model.arch, "config": model.config})
+    input_size = model.config["input_size"]
+    if quantize:
+        model = quantize_model(model)
+
+    example = torch.zeros(1, 3, input_size, input_size)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    traced = torch.jit.freeze(traced)
+    torch.jit.save(traced, output_path, _extra_files={"model.json": metadata})
+    return traced
+
+
+def parity_check(reference: nn.Module, candidate: nn.Module, inputs: torch.Tensor) -> dict:
+    """Compare an exported model's outputs with the float model's.
+
+    Args:
+        reference: Float model
+        candidate: Exported model
+        inputs: Batch of preprocessed inputs
+
+    Returns:
+        dict: Maximum and mean absolute difference of the output scores and
+        the fraction of inputs given the same fake/real label
+    """
+    with torch.no_grad():
+        expected = reference(inputs).view(-1)
+        actual = candidate(inputs).view(-1)
+
+    diff = (expected - actual).abs()
+    agreement = ((expected > 0.5) == (actual > 0.5)).float().mean()
+    return {
+        "samples": inputs.size(0),
+        "max_abs_diff": diff.max().item(),
+        "mean_abs_diff": diff.mean().item(),
+        "label_agreement": agreement.item()
+    }
+
+
+def _parity_inputs(data_dir: str, samples: int, input_size: int) -> torch.Tensor:
+    """Load up to `samples` preprocessed images, or random inputs without data."""
+    if data_dir:
+        from data_loader import FakeNewsDataset
+
+        dataset = FakeNewsDataset(data_dir, raw=True, image_size=input_size)
+        arrays = [dataset[i][0] for i in range(min(samples, len(dataset)))]
+        if arrays:
+            return dataset.preprocessor.normalize(arrays)
+
+    generator = torch.Generator().manual_seed(0)
+    return torch.randn(samples, 3, input_size, input_size, generator=generator)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a quantized TorchScript model for CPU serving")
+    parser.add_argument(
+        "--model_path",
+        type=str,
+        required=True,
+        help="Trained float state_dict to export"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="Path for the exported TorchScript module"
+    )
+    parser.add_argument(
+        "--no_quantize",
+        action="store_true",
+        help="Export the float model without int8 quantization"
+    )
+    parser.add_argument(
+        "--data_dir",
+        type=str,
+        default=None,
+        help="Directory with 'real' and 'fake' images for the parity check (random inputs otherwise)"
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=64,
+        help="Number of inputs used for the parity check"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.02,
+        help="Maximum allowed absolute difference in output scores"
+    )
+    parser.add_argument(
+        "--min_agreement",
+        type=float,
+        default=0.99,
+        help="Minimum fraction of inputs that must keep the same label"
+    )
+
+    args = parser.parse_args()
+
+    classifier = ImageClassifier(model_path=args.model_path, model_format="state_dict")
+    if not classifier.weights_loaded:
+        print(f"Model weights not found: {args.model_path}")
+        sys.exit(1)
+    reference = classifier.model.to("cpu").eval()
+
+    exported = export_torchscript(reference, args.output, quantize=not args.no_quantize)
+    print(f"Exported model saved to: {args.output}")
+
+    inputs = _parity_inputs(args.data_dir, args.samples, classifier.input_size)
+    report = parity_check(reference, exported, inputs)
+    print(f"Parity check on {report['samples']} inputs:")
+    print(f"  Max abs diff: {report['max_abs_diff']:.6f}, Mean abs diff: {report['mean_abs_diff']:.6f}")
+    print(f"  Label agreement: {report['label_agreement']:.4f}")
+
+    if report["max_abs_diff"] > args.tolerance or report["label_agreement"] < args.min_agreement:
+        print("Parity check FAILED")
+        sys.exit(1)
+    print("Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
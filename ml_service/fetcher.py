@@ -0,0 +1,148 @@
+"""Non-blocking pooled image downloader."""
+import asyncio
+import os
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+
+class FetchError(Exception):
+    """Raised when an image cannot be downloaded."""
+
+
+class _HostLimit:
+    """Per-host semaphore and the number of downloads using it."""
+    __slots__ = ("semaphore", "users")
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.users = 0
+
+
+class ImageFetcher:
+    """Async HTTP fetcher shared by all requests in a process.
+
+    A single connection pool with keep-alive is reused across requests, each
+    origin host is limited to `per_host_limit` concurrent downloads so one
+    slow site cannot take every connection, and bodies are streamed with a
+    hard `max_bytes` cutoff. `total_timeout` covers waiting for a per-host
+    slot as well as the download.
+
+    Also used by the Flask backend (see backend/app/shared.py).
+
+    Args:
+        max_connections: Total connections in the pool
+        max_keepalive: Idle connections kept open for reuse
+        per_host_limit: Concurrent downloads allowed per host
+        connect_timeout: Seconds allowed to establish a connection
+        read_timeout: Seconds allowed between received chunks
+        total_timeout: Seconds allowed for the whole download
+        max_bytes: Largest response body accepted
+    """
+    def __init__(self, max_connections: int = 100, max_keepalive: int = 20,
+                 per_host_limit: int = 8, connect_timeout: float = 3.0,
+                 read_timeout: float = 10.0, total_timeout: float = 30.0,
+                 max_bytes: int = 20 * 1024 * 1024):
+        self.per_host_limit = per_host_limit
+        self.total_timeout = total_timeout
+        self.max_bytes = max_bytes
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive
+        )
+        self._timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=read_timeout,
+            pool=total_timeout
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        # Only hosts with downloads in progress or waiting have an entry
+        self._host_limits: Dict[str, _HostLimit] = {}
+
+    @classmethod
+    def from_env(cls) -> "ImageFetcher":
+        """Build a fetcher configured from FETCH_* environment variables."""
+        return cls(
+            max_connections=int(os.getenv("FETCH_MAX_CONNECTIONS", "100")),
+            max_keepalive=int(os.getenv("FETCH_MAX_KEEPALIVE", "20")),
+            per_host_limit=int(os.getenv("FETCH_PER_HOST_LIMIT", "8")),
+            connect_timeout=float(os.getenv("FETCH_CONNECT_TIMEOUT", "3")),
+            read_timeout=float(os.getenv("FETCH_READ_TIMEOUT", "10")),
+            total_timeout=float(os.getenv("FETCH_TOTAL_TIMEOUT", "30")),
+            max_bytes=int(os.getenv("FETCH_MAX_BYTES", str(20 * 1024 * 1024))),
+        )
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=self._limits,
+                timeout=self._timeout,
+                follow_redirects=True,
+                headers={"User-Agent": "verifact-image-fetcher"}
+            )
+        return self._client
+
+    async def _limited_download(self, host: str, url: str) -> bytes:
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = _HostLimit(self.per_host_limit)
+        limit.users += 1
+        try:
+            async with limit.semaphore:
+                return await self._download(url)
+        finally:
+            limit.users -= 1
+            if limit.users == 0:
+                del self._host_limits[host]
+
+    async def fetch(self, url: str) -> bytes:
+        """Download a URL and return its body.
+
+        Args:
+            url: http(s) URL to download
+
+        Returns:
+            bytes: Response body
+
+        Raises:
+            FetchError: On invalid URLs, HTTP errors, timeouts or bodies
+                larger than `max_bytes`
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise FetchError(f"Unsupported URL: {url}")
+
+        try:
+            return await asyncio.wait_for(self._limited_download(parts.hostname, url),
+                                          self.total_timeout)
+        except FetchError:
+            raise
+        except asyncio.TimeoutError:
+            raise FetchError(f"Timed out after {self.total_timeout:.0f}s downloading {url}")
+        except httpx.HTTPStatusError as e:
+            raise FetchError(f"{e.response.status_code} error for url: {url}") from e
+        except httpx.HTTPError as e:
+            raise FetchError(f"{type(e).__name__} for url {url}: {str(e)}") from e
+
+    async def _download(self, url: str) -> bytes:
+        async with self._get_client().stream("GET", url) as response:
+            response.raise_for_status()
+
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                raise FetchError(f"Image too large: {declared} bytes (maximum {self.max_bytes})")
+
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) > self.max_bytes:
+                    raise FetchError(f"Image too large: more than {self.max_bytes} bytes")
+            return bytes(body)
+
+    async def aclose(self):
+        """Close pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -2,8 +2,10 @@
 import io
 import os
 import sys
-from typing import Dict, Any, Optional
-import requests
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 import traceback
 import logging
 
@@ -16,12 +18,20 @@ logging.basicConfig(
     ]
 )
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 from PIL import Image
 from dotenv import load_dotenv
+import numpy as np
 from model import ImageClassifier
+from batching import MicroBatcher, QueueFullError
+from fetcher import FetchError, ImageFetcher
+from prediction_cache import PredictionCache
+from worker_pool import InferencePool
+import metrics
+from profiling import PROFILE_HEADER, PROFILE_MODE_HEADER, TRACE_HEADER, RequestProfiler
 
 # Load environment variables
 load_dotenv()
@@ -43,8 +53,66 @@ app.add_middleware(
     max_age=3600,
 )
 
+# Request counts, latency and in-flight requests for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Initialize the model
+load_start = time.perf_counter()
 model = ImageClassifier()
+metrics.observe_model(model, time.perf_counter() - load_start)
+
+def _predict_inline(arrays) -> list:
+    """Normalize and classify a batch in this process, timing both stages."""
+    with metrics.stage("preprocess"):
+        batch = model.preprocessor.normalize(arrays)
+    with metrics.stage("model"):
+        return model.predict_batch(batch)
+
+# SERVING_MODE=pool runs forward passes in a pool of pinned inference
+# processes sharing the weights; "inline" runs them in this process
+SERVING_MODE = os.getenv("SERVING_MODE", "inline").lower()
+# Spawned workers import the script that started the server as __mp_main__;
+# that copy never serves requests and must not start a pool of its own
+if SERVING_MODE == "pool" and __name__ != "__mp_main__":
+    inference_pool = InferencePool.from_env(model)
+    predict_arrays = metrics.timed("model", inference_pool.predict_arrays)
+    batch_concurrency = inference_pool.num_workers
+else:
+    inference_pool = None
+    predict_arrays = _predict_inline
+    batch_concurrency = 1
+
+# Gather concurrent requests into batched forward passes
+batcher = MicroBatcher(
+    predict_arrays,
+    max_batch_size=int(os.getenv("BATCH_MAX_SIZE", "16")),
+    max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", "5")),
+    max_queue_size=int(os.getenv("BATCH_MAX_QUEUE", "1024")),
+    max_concurrency=batch_concurrency,
+)
+metrics.observe_batcher(batcher)
+
+# Results keyed by image content and model version
+prediction_cache = PredictionCache.from_env()
+
+# Shared pooled downloader for image URLs
+fetcher = ImageFetcher.from_env()
+
+# Opt-in per-request profiling (X-Profile header or sampling)
+profiler = RequestProfiler.from_env()
+
+# Limits and worker threads for /predict/batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "256"))
+preprocess_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PREPROCESS_WORKERS", str(min(8, os.cpu_count() or 1)))),
+    thread_name_prefix="preprocess"
+)
+
+@app.on_event("shutdown")
+async def close_fetcher():
+    await fetcher.aclose()
+    if inference_pool is not None:
+        inference_pool.close()
 
 @app.get("/")
 def root():
@@ -54,8 +122,71 @@ def root():
 def health_check():
     return {"status": "healthy", "service": "verifact-api"}
 
+@app.get("/stats/batching")
+def batching_stats():
+    stats = batcher.stats()
+    if inference_pool is not None:
+        stats["pool"] = inference_pool.stats()
+    return stats
+
+@app.get("/stats/cache")
+def cache_stats():
+    return prediction_cache.stats()
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics: per-stage latency, request outcomes and gauges."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+@app.get("/profiles")
+def list_profiles(request: Request):
+    """List captured request traces (requires the X-Profile token)."""
+    if not profiler.authorized(request.headers.get(PROFILE_HEADER)):
+        return JSONResponse(status_code=403, content={"detail": "Profiling access denied"})
+    return {"traces": profiler.list_traces()}
+
+@app.get("/profiles/{name}")
+def download_profile(name: str, request: Request):
+    """Download one captured trace (requires the X-Profile token)."""
+    if not profiler.authorized(request.headers.get(PROFILE_HEADER)):
+        return JSONResponse(status_code=403, content={"detail": "Profiling access denied"})
+    path = profiler.trace_path(name)
+    if path is None:
+        return JSONResponse(status_code=404, content={"detail": "Trace not found"})
+    return FileResponse(path, filename=name)
+
+def _load_array(contents: bytes) -> np.ndarray:
+    """Decode and resize one image, timing each stage."""
+    with metrics.stage("decode"):
+        image = model.preprocessor.decode(Image.open(io.BytesIO(contents)))
+    with metrics.stage("preprocess"):
+        return model.preprocessor.resize(image)
+
+def _cache_version() -> str:
+    """Cache version: results depend on the weights and on preprocessing."""
+    return f"{model.model_version}/{model.preprocessor.version}"
+
+def _cache_lookup(contents: bytes) -> tuple:
+    """Hash an image and look it up in the prediction cache (blocking).
+
+    Returns:
+        tuple: (cache key, cached result or None)
+    """
+    cache_key = PredictionCache.key(contents)
+    return cache_key, prediction_cache.get(cache_key, _cache_version())
+
+def _cache_store(cache_key: str, prediction, confidence):
+    """Store one result in the prediction cache (blocking)."""
+    prediction_cache.put(cache_key, _cache_version(),
+                         {"prediction": prediction, "confidence": confidence})
+
+def _predict_one(contents: bytes) -> tuple:
+    """Decode, preprocess and classify one image on the calling thread."""
+    return predict_arrays([_load_array(contents)])[0]
+
 @app.post("/predict")
-async def predict(file: Optional[UploadFile] = File(None), url: Optional[str] = Form(None)):
+async def predict(request: Request, file: Optional[UploadFile] = File(None),
+                  url: Optional[str] = Form(None)):
     logging.info("Received prediction request")
     if file:
         logging.info(f"File upload: {file.filename}")
@@ -66,13 +197,11 @@ async def predict(file: Optional[UploadFile] = File(None), url: Optional[str] =
         if file:
             # Read image file
             contents = await file.read()
-            image = Image.open(io.BytesIO(contents))
             source = file.filename
         elif url:
             # Download image from URL
-            response = requests.get(url)
-            response.raise_for_status()
-            image = Image.open(io.BytesIO(response.content))
+            with metrics.stage("fetch"):
+                contents = await fetcher.fetch(url)
             source = url
         else:
             return JSONResponse(
@@ -80,17 +209,54 @@ async def predict(file: Optional[UploadFile] = File(None), url: Optional[str] =
                 content={"detail": "Either file or url must be provided"}
             )
 
+        # Profiled requests always run the model so the trace shows real work
+        profile_mode = profiler.select(request.headers.get(PROFILE_HEADER),
+                                       request.headers.get(PROFILE_MODE_HEADER))
+        # Hashing and the SQLite tier block, so keep them off the event loop
+        if profile_mode:
+            cache_key, cached = PredictionCache.key(contents), None
+        else:
+            cache_key, cached = await run_in_threadpool(_cache_lookup, contents)
+        if cached is not None:
+            return JSONResponse({
+                "source": source,
+                "prediction": cached["prediction"],
+                "confidence": cached["confidence"],
+                "status": "success",
+                "detail": f"Image analyzed successfully"
+            })
+
+        trace_name = None
+        if profile_mode:
+            # Run the whole pipeline on one thread, outside the micro-batcher,
+            # so the trace covers decoding, preprocessing and the forward pass
+            (prediction, confidence), trace_name = await run_in_threadpool(
+                profiler.run, "predict", profile_mode, _predict_one, contents
+            )
+        else:
+            img_array = await run_in_threadpool(_load_array, contents)
+
         # Get prediction
         try:
-            prediction, confidence = model.predict(image)
+            if not profile_mode:
+                prediction, confidence = await batcher.submit(img_array)
+            await run_in_threadpool(_cache_store, cache_key, prediction, confidence)
             
-            return JSONResponse({
+            response = JSONResponse({
                 "source": source,
                 "prediction": prediction,
                 "confidence": confidence,
                 "status": "success",
                 "detail": f"Image analyzed successfully"
             })
+            if trace_name:
+                response.headers[TRACE_HEADER] = trace_name
+            return response
+        except QueueFullError:
+            return JSONResponse(
+                status_code=503,
+                content={"detail": "Server is busy. Please try again."}
+            )
         except Exception as model_error:
             print(f"Model prediction error: {str(model_error)}")
             print(traceback.format_exc())
@@ -99,7 +265,7 @@ async def predict(file: Optional[UploadFile] = File(None), url: Optional[str] =
                 content={"detail": "Error analyzing image. Please try again."}
             )
             
-    except requests.exceptions.RequestException as e:
+    except FetchError as e:
         print(f"URL download error: {str(e)}")
         return JSONResponse(
             status_code=400,
@@ -119,6 +285,109 @@ async def predict(file: Optional[UploadFile] = File(None), url: Optional[str] =
             content={"detail": f"Internal server error. Please try again."}
         )
 
+async def _prepare_batch_item(contents: Optional[bytes], url: Optional[str]) -> tuple:
+    """Download (for URLs) and preprocess one /predict/batch item.
+    
+    Returns:
+        tuple: (cache key, cached result or None, uint8 image array or None)
+    """
+    if url is not None:
+        with metrics.stage("fetch"):
+            contents = await fetcher.fetch(url)
+    loop = asyncio.get_running_loop()
+    cache_key, cached = await loop.run_in_executor(preprocess_executor, _cache_lookup, contents)
+    if cached is not None:
+        return cache_key, cached, None
+    array = await loop.run_in_executor(preprocess_executor, _load_array, contents)
+    return cache_key, None, array
+
+def _store_batch(entries: list):
+    """Store (cache key, prediction, confidence) results (blocking)."""
+    for cache_key, prediction, confidence in entries:
+        _cache_store(cache_key, prediction, confidence)
+
+@app.post("/predict/batch")
+async def predict_batch(files: Optional[List[UploadFile]] = File(None),
+                        urls: Optional[List[str]] = Form(None)):
+    """Predict many images in one call.
+    
+    Items are uploaded files followed by URLs, and results are returned in
+    that order. Each item is decoded and preprocessed in parallel, all
+    valid items are classified in a single batch, and failures are reported
+    per item without failing the whole request.
+    """
+    files = files or []
+    urls = urls or []
+    total = len(files) + len(urls)
+    logging.info(f"Received batch prediction request: {len(files)} files, {len(urls)} URLs")
+    
+    if total == 0:
+        return JSONResponse(
+            status_code=400,
+            content={"detail": "At least one file or url must be provided"}
+        )
+    if total > BATCH_MAX_ITEMS:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Too many items: {total} (maximum {BATCH_MAX_ITEMS})"}
+        )
+    
+    items = []
+    for upload in files:
+        items.append((upload.filename, await upload.read(), None))
+    for url in urls:
+        items.append((url, None, url))
+    
+    loaded = await asyncio.gather(
+        *[_prepare_batch_item(contents, url) for _, contents, url in items],
+        return_exceptions=True
+    )
+    
+    results = []
+    valid = []
+    for index, ((source, _, _), outcome) in enumerate(zip(items, loaded)):
+        result = {"index": index, "source": source}
+        if isinstance(outcome, FetchError):
+            result.update(status="error", detail=f"Error downloading image: {str(outcome)}")
+        elif isinstance(outcome, (IOError, Image.UnidentifiedImageError)):
+            result.update(status="error", detail=f"Invalid image file: {str(outcome)}")
+        elif isinstance(outcome, Exception):
+            print(f"Unexpected error: {str(outcome)}")
+            result.update(status="error", detail="Error processing image")
+        else:
+            cache_key, cached, array = outcome
+            if cached is not None:
+                result.update(status="success", **cached)
+            else:
+                valid.append((result, cache_key, array))
+        results.append(result)
+    
+    if valid:
+        try:
+            arrays = [array for _, _, array in valid]
+            predictions = await run_in_threadpool(predict_arrays, arrays)
+            for (result, cache_key, _), (prediction, confidence) in zip(valid, predictions):
+                result.update(status="success", prediction=prediction, confidence=confidence)
+            await run_in_threadpool(_store_batch, [
+                (cache_key, prediction, confidence)
+                for (_, cache_key, _), (prediction, confidence) in zip(valid, predictions)
+            ])
+        except Exception as model_error:
+            print(f"Model prediction error: {str(model_error)}")
+            print(traceback.format_exc())
+            for result, _, _ in valid:
+                result.update(status="error", detail="Error analyzing image. Please try again.")
+    
+    succeeded = sum(1 for result in results if result["status"] == "success")
+    return JSONResponse({
+        "results": results,
+        "total": total,
+        "succeeded": succeeded,
+        "failed": total - succeeded,
+        "status": "success",
+        "detail": f"Analyzed {succeeded} of {total} images"
+    })
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv('PORT', '8080'))
@@ -0,0 +1,128 @@
+"""Prometheus metrics for the ML service, served at /metrics.
+
+Stage histograms show where request time goes:
+
+    fetch       downloading an image URL
+    decode      JPEG/PNG decoding and RGB conversion
+    preprocess  resizing to the model input, and batch normalization
+    model       the forward pass (once per batch when micro-batching)
+
+Recording is a lock-protected increment on pre-bound label children, so
+the metrics can stay enabled in production.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+STAGES = ("fetch", "decode", "preprocess", "model")
+
+# Sub-millisecond preprocessing up to slow downloads
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = Histogram(
+    "ml_stage_duration_seconds", "Time spent in each pipeline stage",
+    ["stage"], buckets=STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "ml_request_duration_seconds", "HTTP request latency by endpoint",
+    ["endpoint"], buckets=STAGE_BUCKETS
+)
+REQUESTS = Counter(
+    "ml_requests_total", "HTTP requests by endpoint and outcome",
+    ["endpoint", "outcome"]
+)
+IN_FLIGHT = Gauge("ml_requests_in_flight", "HTTP requests currently being handled")
+BATCH_QUEUE_DEPTH = Gauge("ml_batch_queue_depth", "Images waiting for a micro-batch")
+BATCHES_IN_FLIGHT = Gauge("ml_batches_in_flight", "Micro-batches currently running")
+MODEL_LOAD_SECONDS = Gauge("ml_model_load_seconds", "Time taken to load the model at startup")
+MODEL_INFO = Gauge("ml_model_info", "Model being served", ["version", "arch", "format"])
+
+_stages = {name: STAGE_SECONDS.labels(name) for name in STAGES}
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as one observation of a pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stages[name].observe(time.perf_counter() - start)
+
+
+def timed(name: str, fn):
+    """Wrap `fn` so every call is timed as stage `name`."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def outcome(status_code: int) -> str:
+    """Map an HTTP status to a low-cardinality outcome label."""
+    if status_code < 400:
+        return "success"
+    if status_code == 503:
+        return "rejected"
+    if status_code < 500:
+        return "client_error"
+    return "server_error"
+
+
+def observe_model(classifier, load_seconds: float):
+    """Record how long the model took to load and which one is served."""
+    MODEL_LOAD_SECONDS.set(load_seconds)
+    MODEL_INFO.labels(classifier.model_version, classifier.arch, classifier.model_format).set(1)
+
+
+def observe_batcher(batcher):
+    """Report the micro-batcher's queue depth and running batches at scrape time."""
+    BATCH_QUEUE_DEPTH.set_function(lambda: batcher.stats()["queue_depth"])
+    BATCHES_IN_FLIGHT.set_function(lambda: batcher.stats()["running_batches"])
+
+
+def render() -> bytes:
+    """Current metrics in the Prometheus text format."""
+    return generate_latest()
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests by route and outcome.
+
+    Implemented as plain ASGI rather than `BaseHTTPMiddleware` so responses
+    are not re-wrapped. Requests that match no route are labelled "other"
+    to keep label cardinality bounded.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            if route is not None:
+                endpoint = route.path
+            else:
+                endpoint = scope["path"] if status_code != 404 else "other"
+            REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+            REQUESTS.labels(endpoint, outcome(status_code)).inc()
@@ -1,17 +1,55 @@
 """Image classification model for fake image detection."""
 import os
 import math
+import json
+import time
+import hashlib
+import inspect
+import traceback
+import contextlib
 from PIL import Image
 import logging
 
 import torch
 import torch.nn as nn
-import torchvision.transforms as transforms
+from torch.nn.parallel import DistributedDataParallel
 from dotenv import load_dotenv
 
+from preprocessing import Preprocessor
+from checkpoint import AsyncCheckpointWriter, capture_rng_state, load_checkpoint, restore_rng_state
+from distributed import all_reduce_sum, is_distributed, is_main_process
+
+# Serialized model formats ImageClassifier can load (MODEL_FORMAT):
+#   state_dict  - float32 weights, as saved by training (see save_model)
+#   quantized   - float32 state_dict, dynamically quantized to int8 on load
+#   torchscript - TorchScript module written by export.py
+MODEL_FORMATS = ("state_dict", "quantized", "torchscript")
+
+
+def quantize_model(model: nn.Module) -> nn.Module:
+    """Dynamically quantize a model's Linear layers to int8 for CPU inference.
+    
+    Weights are stored as int8 and activations are quantized on the fly,
+    which shrinks the large fully connected layers about 4x.
+    
+    Args:
+        model: Float model
+        
+    Returns:
+        nn.Module: Quantized copy of the model, in eval mode on CPU
+    """
+    model = model.to("cpu").eval()
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
 class SimpleCNN(nn.Module):
     """Simple CNN architecture for fake image detection.
     
+    The convolutional output is flattened into `fc1`, so the layer sizes
+    depend on `input_size` and almost all parameters sit in `fc1`.
+    
+    Args:
+        input_size: Side length of the square input images
+    
     Attributes:
         conv1 (nn.Conv2d): First convolutional layer.
         pool (nn.MaxPool2d): Max pooling layer.
@@ -20,12 +58,17 @@ class SimpleCNN(nn.Module):
         fc2 (nn.Linear): Second fully connected layer.
         sigmoid (nn.Sigmoid): Sigmoid activation function.
     """
-    def __init__(self):
+    arch = "simple_cnn"
+
+    def __init__(self, input_size: int = 224):
         super(SimpleCNN, self).__init__()
+        self.config = {"input_size": input_size}
+        side = ((input_size - 2) // 2 - 2) // 2
+        self.flat_features = 64 * side * side
         self.conv1 = nn.Conv2d(3, 32, 3)
         self.pool = nn.MaxPool2d(2, 2)
         self.conv2 = nn.Conv2d(32, 64, 3)
-        self.fc1 = nn.Linear(64 * 54 * 54, 64)
+        self.fc1 = nn.Linear(self.flat_features, 64)
         self.fc2 = nn.Linear(64, 1)
         self.sigmoid = nn.Sigmoid()
 
@@ -33,75 +76,298 @@ class SimpleCNN(nn.Module):
         """Forward pass of the CNN.
         
         Args:
-            x: Input tensor of shape (batch_size, 3, 224, 224)
+            x: Input tensor of shape (batch_size, 3, input_size, input_size)
             
         Returns:
             Tensor of shape (batch_size, 1) with values between 0 and 1
         """
         x = self.pool(torch.relu(self.conv1(x)))
         x = self.pool(torch.relu(self.conv2(x)))
-        x = x.view(-1, 64 * 54 * 54)
+        x = x.reshape(-1, self.flat_features)
+        x = torch.relu(self.fc1(x))
+        x = self.sigmoid(self.fc2(x))
+        return x
+
+class PooledCNN(nn.Module):
+    """CNN with adaptive average pooling before the classifier head.
+    
+    Pooling the final feature map to a fixed `pool_size` x `pool_size` grid
+    (global average pooling for 1) makes the head independent of the input
+    resolution and keeps it small, so the same architecture can be trained
+    and served at any `input_size`.
+    
+    Args:
+        width: Channels in the first convolution; later blocks use 2x and 4x
+        input_size: Side length of the square input images
+        pool_size: Output grid of the adaptive pooling layer
+    
+    Attributes:
+        features (nn.Sequential): Convolutional blocks.
+        pool (nn.AdaptiveAvgPool2d): Adaptive average pooling layer.
+        fc1 (nn.Linear): First fully connected layer.
+        fc2 (nn.Linear): Second fully connected layer.
+        sigmoid (nn.Sigmoid): Sigmoid activation function.
+    """
+    arch = "pooled_cnn"
+
+    def __init__(self, width: int = 32, input_size: int = 224, pool_size: int = 1):
+        super(PooledCNN, self).__init__()
+        self.config = {"width": width, "input_size": input_size, "pool_size": pool_size}
+        self.features = nn.Sequential(
+            nn.Conv2d(3, width, 3, padding=1),
+            nn.BatchNorm2d(width),
+            nn.ReLU(inplace=True),
+            nn.MaxPool2d(2, 2),
+            nn.Conv2d(width, width * 2, 3, padding=1),
+            nn.BatchNorm2d(width * 2),
+            nn.ReLU(inplace=True),
+            nn.MaxPool2d(2, 2),
+            nn.Conv2d(width * 2, width * 4, 3, padding=1),
+            nn.BatchNorm2d(width * 4),
+            nn.ReLU(inplace=True),
+        )
+        self.pool = nn.AdaptiveAvgPool2d(pool_size)
+        self.fc1 = nn.Linear(width * 4 * pool_size * pool_size, 64)
+        self.fc2 = nn.Linear(64, 1)
+        self.sigmoid = nn.Sigmoid()
+
+    def forward(self, x):
+        """Forward pass of the CNN.
+        
+        Args:
+            x: Input tensor of shape (batch_size, 3, height, width)
+            
+        Returns:
+            Tensor of shape (batch_size, 1) with values between 0 and 1
+        """
+        x = self.pool(self.features(x))
+        x = torch.flatten(x, 1)
         x = torch.relu(self.fc1(x))
         x = self.sigmoid(self.fc2(x))
         return x
 
+# Model architectures selectable by name (MODEL_ARCH, train.py --arch)
+MODEL_REGISTRY = {
+    SimpleCNN.arch: SimpleCNN,
+    PooledCNN.arch: PooledCNN,
+}
+
+
+def build_model(arch: str = SimpleCNN.arch, **config) -> nn.Module:
+    """Instantiate a registered architecture.
+    
+    Args:
+        arch: Name in MODEL_REGISTRY
+        **config: Constructor arguments, e.g. width or input_size; settings
+            the architecture does not take (such as width for simple_cnn)
+            are ignored with a warning
+        
+    Returns:
+        nn.Module: Freshly initialized model
+    """
+    if arch not in MODEL_REGISTRY:
+        raise ValueError(f"Unknown model architecture '{arch}', expected one of {sorted(MODEL_REGISTRY)}")
+    model_class = MODEL_REGISTRY[arch]
+    accepted = inspect.signature(model_class.__init__).parameters
+    ignored = sorted(set(config) - set(accepted))
+    if ignored:
+        logging.warning(f"Ignoring settings not used by '{arch}': {', '.join(ignored)}")
+        config = {name: value for name, value in config.items() if name in accepted}
+    return model_class(**config)
+
+
+def model_config_from_env() -> dict:
+    """Read architecture settings from MODEL_WIDTH / MODEL_INPUT_SIZE.
+    
+    Returns:
+        dict: Constructor arguments for the variables that are set
+    """
+    config = {}
+    if os.getenv("MODEL_WIDTH"):
+        config["width"] = int(os.getenv("MODEL_WIDTH"))
+    if os.getenv("MODEL_INPUT_SIZE"):
+        config["input_size"] = int(os.getenv("MODEL_INPUT_SIZE"))
+    return config
+
+
+def save_model(model: nn.Module, path: str):
+    """Save a model's weights together with its architecture.
+    
+    Args:
+        model: Registered model to save
+        path: Destination file
+    """
+    torch.save({
+        "arch": model.arch,
+        "config": model.config,
+        "state_dict": model.state_dict()
+    }, path)
+
+
+def load_model(path: str, map_location=None, arch: str = SimpleCNN.arch, **config) -> nn.Module:
+    """Load a model saved by `save_model`.
+    
+    Plain state_dicts from older checkpoints are also accepted; their
+    architecture is taken from `arch` and `config`.
+    
+    Args:
+        path: Checkpoint file
+        map_location: Device to load the weights onto
+        arch: Architecture for plain state_dict checkpoints
+        **config: Constructor arguments for plain state_dict checkpoints
+        
+    Returns:
+        nn.Module: Model with the saved weights
+    """
+    checkpoint = torch.load(path, map_location=map_location)
+    if isinstance(checkpoint, dict) and "state_dict" in checkpoint and "arch" in checkpoint:
+        arch = checkpoint["arch"]
+        config = checkpoint.get("config", {})
+        checkpoint = checkpoint["state_dict"]
+    model = build_model(arch, **config)
+    model.load_state_dict(checkpoint)
+    return model
+
 class ImageClassifier:
-    """Image classifier for fake image detection."""
-    def __init__(self):
+    """Image classifier for fake image detection.
+    
+    Checkpoints written by `save_model` carry their own architecture; `arch`
+    and `model_config` describe the model to build when there is no
+    checkpoint yet or it is a plain state_dict.
+    
+    Args:
+        model_path: Weights to load; defaults to MODEL_PATH
+        model_format: One of MODEL_FORMATS; defaults to MODEL_FORMAT. The
+            quantized and torchscript formats are for CPU serving only.
+        arch: Name in MODEL_REGISTRY; defaults to MODEL_ARCH
+        model_config: Architecture arguments; defaults to
+            `model_config_from_env()`
+        pretrained: Load weights from `model_path` if the file exists
+    """
+    def __init__(self, model_path: str = None, model_format: str = None,
+                 arch: str = None, model_config: dict = None, pretrained: bool = True):
         try:
-            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            model_format = (model_format or os.getenv("MODEL_FORMAT", "state_dict")).lower()
+            if model_format not in MODEL_FORMATS:
+                raise ValueError(f"Unknown MODEL_FORMAT '{model_format}', expected one of {MODEL_FORMATS}")
+            self.model_format = model_format
+            
+            if model_format == "state_dict":
+                self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            else:
+                self.device = torch.device("cpu")
             print(f"Using device: {self.device}")
             
-            # Initialize model
-            self.model = SimpleCNN().to(self.device)
+            arch = arch or os.getenv("MODEL_ARCH", SimpleCNN.arch)
+            if model_config is None:
+                model_config = model_config_from_env()
             
-            # Set up image transformation
-            self.transform = transforms.Compose([
-                transforms.Resize((224, 224)),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                                  std=[0.229, 0.224, 0.225])
-            ])
+            self.weights_loaded = False
+            # Identifies the weights behind a prediction, e.g. for caching
+            self.model_version = "heuristic"
             
             # Try to load model weights if they exist
-            model_path = os.getenv("MODEL_PATH", "./models/fake_detector.pt")
-            if os.path.exists(model_path):
-                print(f"Loading model from {model_path}")
-                self.model.load_state_dict(torch.load(model_path, map_location=self.device))
+            model_path = model_path or os.getenv("MODEL_PATH", "./models/fake_detector.pt")
+            self.model_path = model_path
+            if pretrained and os.path.exists(model_path):
+                print(f"Loading {model_format} model from {model_path}")
+                if model_format == "torchscript":
+                    extra_files = {"model.json": ""}
+                    self.model = torch.jit.load(model_path, map_location=self.device,
+                                                _extra_files=extra_files)
+                    if extra_files["model.json"]:
+                        saved = json.loads(extra_files["model.json"])
+                        arch, model_config = saved["arch"], saved["config"]
+                    self.arch, self.model_config = arch, dict(model_config)
+                else:
+                    self.model = load_model(model_path, self.device, arch, **model_config).to(self.device)
+                    if self.model.arch != arch:
+                        print(f"Checkpoint architecture '{self.model.arch}' overrides '{arch}'")
+                    self.arch, self.model_config = self.model.arch, dict(self.model.config)
+                    if model_format == "quantized":
+                        self.model = quantize_model(self.model)
+                self.weights_loaded = True
+                self.model_version = self._file_digest(model_path)
+                if model_format != "state_dict":
+                    self.model_version = f"{model_format}:{self.model_version}"
             else:
                 print("No pre-trained model found. Using default initialization.")
+                self.model = build_model(arch, **model_config).to(self.device)
+                self.arch, self.model_config = self.model.arch, dict(self.model.config)
+            
+            # Set up image preprocessing (shared with FakeNewsDataset)
+            self.input_size = self.model_config.get("input_size", 224)
+            self.preprocessor = Preprocessor((self.input_size, self.input_size))
             
             self.model.eval()
         except Exception as e:
             print(f"Error initializing model: {str(e)}")
             raise
 
-    def predict(self, image: Image.Image) -> tuple:
-        """Predict if an image is fake or real.
+    @staticmethod
+    def _file_digest(path: str) -> str:
+        """Return the SHA-256 hex digest of a file's contents."""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def preprocess(self, image: Image.Image) -> torch.Tensor:
+        """Convert a PIL image into a normalized model input tensor.
         
         Args:
-            image: PIL Image to classify
+            image: PIL Image to preprocess
             
         Returns:
-            tuple: (prediction label ('fake' or 'real'), confidence score)
+            Tensor of shape (3, input_size, input_size)
         """
-        try:
-            logging.info("Starting image prediction")
+        return self.preprocessor(image)
+
+    def predict_arrays(self, arrays) -> list:
+        """Classify uint8 images produced by `preprocessor.to_array`.
+        
+        The arrays are normalized into one batch tensor in a single pass.
+        
+        Args:
+            arrays: Sequence of uint8 arrays of shape (input_size, input_size, 3)
             
-            # Ensure image is in RGB mode
-            if image.mode != 'RGB':
-                logging.info(f"Converting image from {image.mode} to RGB")
-                image = image.convert('RGB')
+        Returns:
+            list: One (prediction label, confidence score) tuple per image
+        """
+        return self.predict_batch(self.preprocessor.normalize(arrays))
+
+    def predict_batch(self, batch: torch.Tensor) -> list:
+        """Classify a batch of preprocessed images in a single pass.
+        
+        Args:
+            batch: Tensor of shape (batch_size, 3, input_size, input_size) as produced by
+                stacking the output of `preprocess`
             
-            # Transform image
-            img_tensor = self.transform(image).unsqueeze(0).to(self.device)
-            logging.info(f"Image transformed to tensor of shape {img_tensor.shape}")
+        Returns:
+            list: One (prediction label, confidence score) tuple per image,
+            in batch order
+        """
+        batch = batch.to(self.device)
+        
+        with torch.no_grad():
+            if self.weights_loaded:
+                scores = self.model(batch).view(-1).tolist()
+                results = []
+                for score in scores:
+                    prediction = "fake" if score > 0.5 else "real"
+                    confidence = score if prediction == "fake" else 1.0 - score
+                    results.append((prediction, confidence))
+                return results
             
             # Since we don't have a trained model yet, use image statistics
             # to generate a deterministic but pseudo-random prediction
-            img_mean = torch.mean(img_tensor).item()
-            img_std = torch.std(img_tensor).item()
-            
+            flat = batch.flatten(start_dim=1)
+            img_means = flat.mean(dim=1).tolist()
+            img_stds = flat.std(dim=1).tolist()
+        
+        results = []
+        for img_mean, img_std in zip(img_means, img_stds):
             # Use image statistics to generate a prediction
             # This will give consistent results for the same image
             seed = (img_mean + img_std) * 10
@@ -110,6 +376,26 @@ class ImageClassifier:
             # Make prediction more interpretable
             confidence = min(0.95, max(0.6, confidence))  # Keep confidence between 60% and 95%
             prediction = "fake" if confidence > 0.75 else "real"
+            results.append((prediction, confidence))
+        return results
+
+    def predict(self, image: Image.Image) -> tuple:
+        """Predict if an image is fake or real.
+        
+        Args:
+            image: PIL Image to classify
+            
+        Returns:
+            tuple: (prediction label ('fake' or 'real'), confidence score)
+        """
+        try:
+            logging.info("Starting image prediction")
+            
+            # Transform image
+            img_tensor = self.preprocess(image).unsqueeze(0)
+            logging.info(f"Image transformed to tensor of shape {img_tensor.shape}")
+            
+            prediction, confidence = self.predict_batch(img_tensor)[0]
             
             logging.info(f"Prediction: {prediction}, Confidence: {confidence:.2f}")
             return prediction, confidence
@@ -119,107 +405,221 @@ class ImageClassifier:
             logging.error(traceback.format_exc())
             raise
 
-    def train(self, train_loader, val_loader=None, epochs=10, save_path=None):
+    def train(self, train_loader, val_loader=None, epochs=10, save_path=None,
+              bf16=False, channels_last=False, compile=False,
+              checkpoint_dir=None, resume_from=None):
         """Train the model on new data.
         
+        Loss and accuracy are accumulated on the device and read back once
+        per epoch, so the step loop never waits on a `.item()` sync. Model
+        and checkpoint files are written by a background thread.
+        
+        When a torch.distributed process group is active (see
+        distributed.py) the model is wrapped in DistributedDataParallel,
+        metrics are summed over all processes, and only the main process
+        prints and writes files.
+        
         Args:
             train_loader: DataLoader with training data
             val_loader: Optional validation data loader
             epochs: Number of training epochs
             save_path: Optional path to save the best model
+            bf16: Run forward passes under bfloat16 autocast
+            channels_last: Use channels_last memory format for the model
+                and inputs
+            compile: Wrap the model with `torch.compile` when available
+            checkpoint_dir: Optional directory for a full checkpoint (model,
+                optimizer, epoch, RNG state and history) after every epoch
+            resume_from: Checkpoint path or loaded checkpoint to continue from
             
         Returns:
-            dict: Training history with losses and accuracies
+            dict: Training history with losses, accuracies and throughput
         """
         criterion = nn.BCELoss()
         optimizer = torch.optim.Adam(self.model.parameters())
         
+        memory_format = torch.channels_last if channels_last else torch.contiguous_format
+        self.model.to(memory_format=memory_format)
+        forward = self.model
+        if compile and hasattr(torch, 'compile'):
+            forward = torch.compile(self.model)
+        
+        # Gradients are averaged across processes during backward; ranks
+        # that run out of batches early shadow the others' all-reduces
+        train_forward = forward
+        join = contextlib.nullcontext
+        if is_distributed():
+            device_ids = [torch.cuda.current_device()] if self.device.type == 'cuda' else None
+            train_forward = DistributedDataParallel(forward, device_ids=device_ids)
+            join = train_forward.join
+        main_process = is_main_process()
+        
         best_val_loss = float('inf')
         history = {
             'train_loss': [],
             'train_acc': [],
             'val_loss': [],
-            'val_acc': []
+            'val_acc': [],
+            'images_per_sec': []
         }
+        start_epoch = 0
+        
+        if resume_from is not None:
+            checkpoint = resume_from
+            if isinstance(resume_from, str):
+                checkpoint = load_checkpoint(resume_from, map_location=self.device)
+            self.model.load_state_dict(checkpoint['model']['state_dict'])
+            optimizer.load_state_dict(checkpoint['optimizer'])
+            history = checkpoint['history']
+            best_val_loss = checkpoint['best_val_loss']
+            start_epoch = checkpoint['epoch'] + 1
+            restore_rng_state(checkpoint['rng'])
+            if main_process:
+                print(f'Resuming from epoch {start_epoch + 1}/{epochs}')
         
-        for epoch in range(epochs):
+        writer = AsyncCheckpointWriter(checkpoint_dir)
+        
+        for epoch in range(start_epoch, epochs):
+            # Reshuffle streaming datasets
+            if hasattr(train_loader.dataset, 'set_epoch'):
+                train_loader.dataset.set_epoch(epoch)
+            if hasattr(train_loader.sampler, 'set_epoch'):
+                train_loader.sampler.set_epoch(epoch)
+            
             # Training phase
             self.model.train()
-            train_loss = 0.0
-            train_correct = 0
+            train_loss = torch.zeros((), device=self.device)
+            train_correct = torch.zeros((), device=self.device)
             train_total = 0
+            train_batches = 0
+            epoch_start = time.perf_counter()
             
-            for inputs, labels in train_loader:
-                inputs = inputs.to(self.device)
-                labels = labels.to(self.device)
-                
-                optimizer.zero_grad()
-                outputs = self.model(inputs)
-                loss = criterion(outputs, labels)
-                
-                loss.backward()
-                optimizer.step()
-                
-                train_loss += loss.item()
-                predictions = (outputs > 0.5).float()
-                train_correct += (predictions == labels).sum().item()
-                train_total += labels.size(0)
+            with join():
+                for inputs, labels in train_loader:
+                    inputs = inputs.to(self.device, non_blocking=True, memory_format=memory_format)
+                    labels = labels.to(self.device, non_blocking=True)
+                    
+                    optimizer.zero_grad(set_to_none=True)
+                    with torch.autocast(device_type=self.device.type, dtype=torch.bfloat16, enabled=bf16):
+                        outputs = train_forward(inputs)
+                    # BCELoss is not autocast-safe, so compute it in float32
+                    outputs = outputs.float()
+                    loss = criterion(outputs, labels)
+                    
+                    loss.backward()
+                    optimizer.step()
+                    
+                    train_loss += loss.detach()
+                    train_correct += ((outputs.detach() > 0.5).float() == labels).sum()
+                    train_total += labels.size(0)
+                    train_batches += 1
             
-            avg_train_loss = train_loss / len(train_loader)
-            train_accuracy = train_correct / train_total
+            # Streaming loaders have no length, so count batches instead;
+            # totals are summed over all processes
+            totals = torch.stack([
+                train_loss, train_correct,
+                torch.tensor(float(train_total), device=self.device),
+                torch.tensor(float(train_batches), device=self.device)
+            ])
+            train_loss, train_correct, train_total, train_batches = all_reduce_sum(totals).tolist()
+            avg_train_loss = train_loss / max(train_batches, 1)
+            train_accuracy = train_correct / max(train_total, 1)
+            images_per_sec = train_total / (time.perf_counter() - epoch_start)
             
             history['train_loss'].append(avg_train_loss)
             history['train_acc'].append(train_accuracy)
+            history['images_per_sec'].append(images_per_sec)
             
             # Validation phase
             if val_loader:
-                val_loss, val_accuracy = self._validate(val_loader, criterion)
+                val_loss, val_accuracy = self._validate(val_loader, criterion, forward,
+                                                        bf16=bf16, memory_format=memory_format)
                 history['val_loss'].append(val_loss)
                 history['val_acc'].append(val_accuracy)
                 
-                print(f'Epoch {epoch+1}/{epochs}:')
-                print(f'  Train Loss: {avg_train_loss:.4f}, Train Acc: {train_accuracy:.4f}')
-                print(f'  Val Loss: {val_loss:.4f}, Val Acc: {val_accuracy:.4f}')
+                if main_process:
+                    print(f'Epoch {epoch+1}/{epochs}:')
+                    print(f'  Train Loss: {avg_train_loss:.4f}, Train Acc: {train_accuracy:.4f}, '
+                          f'Images/sec: {images_per_sec:.1f}')
+                    print(f'  Val Loss: {val_loss:.4f}, Val Acc: {val_accuracy:.4f}')
                 
                 # Save best model
                 if save_path and val_loss < best_val_loss:
                     best_val_loss = val_loss
-                    torch.save(self.model.state_dict(), save_path)
-            else:
+                    if main_process:
+                        writer.write(save_path, self._model_payload())
+            elif main_process:
                 print(f'Epoch {epoch+1}/{epochs}:')
-                print(f'  Train Loss: {avg_train_loss:.4f}, Train Acc: {train_accuracy:.4f}')
+                print(f'  Train Loss: {avg_train_loss:.4f}, Train Acc: {train_accuracy:.4f}, '
+                      f'Images/sec: {images_per_sec:.1f}')
+            
+            if checkpoint_dir and main_process:
+                writer.save_epoch(epoch, {
+                    'model': self._model_payload(),
+                    'optimizer': optimizer.state_dict(),
+                    'epoch': epoch,
+                    'history': history,
+                    'best_val_loss': best_val_loss,
+                    'save_path': save_path,
+                    'rng': capture_rng_state()
+                })
         
+        writer.close()
+        self.model.to(memory_format=torch.contiguous_format)
         return history
     
-    def _validate(self, val_loader, criterion):
+    def _model_payload(self) -> dict:
+        """Model weights and architecture in the `save_model` format."""
+        return {
+            "arch": self.model.arch,
+            "config": self.model.config,
+            "state_dict": self.model.state_dict()
+        }
+    
+    def _validate(self, val_loader, criterion, forward=None, bf16=False,
+                  memory_format=torch.contiguous_format):
         """Run validation on the model.
         
         Args:
             val_loader: Validation data loader
             criterion: Loss function
+            forward: Callable used for the forward pass (defaults to the model)
+            bf16: Run forward passes under bfloat16 autocast
+            memory_format: Memory format for the inputs
             
         Returns:
-            tuple: (validation loss, validation accuracy)
+            tuple: (validation loss, validation accuracy), summed over all
+                processes when running distributed
         """
+        forward = forward or self.model
         self.model.eval()
-        val_loss = 0.0
-        val_correct = 0
+        val_loss = torch.zeros((), device=self.device)
+        val_correct = torch.zeros((), device=self.device)
         val_total = 0
+        val_batches = 0
         
         with torch.no_grad():
             for inputs, labels in val_loader:
-                inputs = inputs.to(self.device)
-                labels = labels.to(self.device)
+                inputs = inputs.to(self.device, non_blocking=True, memory_format=memory_format)
+                labels = labels.to(self.device, non_blocking=True)
                 
-                outputs = self.model(inputs)
+                with torch.autocast(device_type=self.device.type, dtype=torch.bfloat16, enabled=bf16):
+                    outputs = forward(inputs)
+                outputs = outputs.float()
                 loss = criterion(outputs, labels)
                 
-                val_loss += loss.item()
-                predictions = (outputs > 0.5).float()
-                val_correct += (predictions == labels).sum().item()
+                val_loss += loss
+                val_correct += ((outputs > 0.5).float() == labels).sum()
                 val_total += labels.size(0)
+                val_batches += 1
         
-        return val_loss / len(val_loader), val_correct / val_total
+        totals = torch.stack([
+            val_loss, val_correct,
+            torch.tensor(float(val_total), device=self.device),
+            torch.tensor(float(val_batches), device=self.device)
+        ])
+        val_loss, val_correct, val_total, val_batches = all_reduce_sum(totals).tolist()
+        return val_loss / max(val_batches, 1), val_correct / max(val_total, 1)
         
         self.model.eval()
         
@@ -0,0 +1,209 @@
+"""Content-addressed cache of prediction results."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class PredictionCache:
+    """Two-tier cache of predictions keyed by image content and model version.
+
+    Entries are keyed by the SHA-256 of the raw image bytes. The in-memory
+    tier is an LRU bounded by `max_entries`; the optional SQLite tier at
+    `disk_path` survives restarts. Both tiers expire entries after
+    `ttl_seconds`. Every lookup carries the current model version and only
+    matches entries computed by that version, so swapping weights never
+    serves stale results. The disk tier may be shared by several processes
+    serving different versions (e.g. during a rolling deploy): entries of
+    other versions are deleted only once they are `stale_seconds` old, so
+    processes never delete each other's live entries.
+
+    Also used by the Flask backend (see backend/app/shared.py).
+
+    Args:
+        max_entries: Maximum entries held in memory
+        ttl_seconds: Entry lifetime in seconds (0 disables expiry)
+        disk_path: Optional SQLite file for the persistent tier
+        stale_seconds: Age after which disk entries of other model
+            versions are deleted
+    """
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400.0,
+                 disk_path: Optional[str] = None, stale_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.disk_path = disk_path
+        self.model_version = None
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if disk_path:
+            directory = os.path.dirname(disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                " key TEXT NOT NULL,"
+                " version TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " PRIMARY KEY (key, version))"
+            )
+            self._db.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls, disk_path_var: str = "CACHE_DB_PATH") -> "PredictionCache":
+        """Build a cache configured from CACHE_* environment variables.
+
+        Args:
+            disk_path_var: Variable naming the SQLite file; each service
+                reads its own so they never share one by accident
+        """
+        return cls(
+            max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "10000")),
+            ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", "86400")),
+            disk_path=os.getenv(disk_path_var) or None,
+            stale_seconds=float(os.getenv("CACHE_STALE_SECONDS", "3600")),
+        )
+
+    @staticmethod
+    def key(image_data: bytes) -> str:
+        """Return the content key for raw image bytes."""
+        return hashlib.sha256(image_data).hexdigest()
+
+    def _use_version(self, model_version: str, now: float):
+        """Switch this process to `model_version`. Caller holds the lock.
+
+        The memory tier is this process's own and is cleared. On disk, only
+        expired entries and other versions' entries older than
+        `stale_seconds` are deleted; newer ones may belong to another
+        process still serving that version.
+        """
+        if model_version == self.model_version:
+            return
+        if self.model_version is not None:
+            self.invalidations += 1
+        self._memory.clear()
+        if self._db is not None:
+            query = "DELETE FROM predictions WHERE (version != ? AND created < ?)"
+            params = [model_version, now - self.stale_seconds]
+            if self.ttl_seconds > 0:
+                query += " OR created < ?"
+                params.append(now - self.ttl_seconds)
+            self._db.execute(query, params)
+            self._db.commit()
+        self.model_version = model_version
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created > self.ttl_seconds
+
+    def get(self, key: str, model_version: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached prediction.
+
+        Args:
+            key: Content key from `key()`
+            model_version: Version of the model that would compute the result
+
+        Returns:
+            dict or None: Cached result, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            self._use_version(model_version, now)
+
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+                self.expirations += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM predictions WHERE key = ? AND version = ?",
+                    (key, model_version)
+                ).fetchone()
+                if row is not None:
+                    if not self._expired(row[1], now):
+                        value = json.loads(row[0])
+                        self._remember(key, value, row[1])
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute(
+                        "DELETE FROM predictions WHERE key = ? AND version = ?",
+                        (key, model_version)
+                    )
+                    self._db.commit()
+                    self.expirations += 1
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, model_version: str, value: Dict[str, Any]):
+        """Store a prediction computed by `model_version`.
+
+        Args:
+            key: Content key from `key()`
+            model_version: Version of the model that computed the result
+            value: JSON-serializable result
+        """
+        now = time.time()
+        with self._lock:
+            self._use_version(model_version, now)
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions (key, version, value, created)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, model_version, json.dumps(value), now)
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, value: Dict[str, Any], created: float):
+        """Insert into the memory tier. Caller holds the lock."""
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache configuration, size and hit/miss counters."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            disk_entries = None
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            return {
+                "model_version": self.model_version,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "stale_seconds": self.stale_seconds,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,181 @@
+"""Image preprocessing shared by inference and training."""
+import io
+import os
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+from PIL import Image
+
+# Model input resolution (height, width)
+INPUT_SIZE = (224, 224)
+
+# ImageNet normalization statistics
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+# Let the JPEG decoder downscale (DCT scaling) before the final resize. The
+# draft target is kept at DRAFT_OVERSAMPLE x the input size so the resize
+# still averages several source pixels per output pixel; the resulting
+# tensor is expected to stay within DRAFT_TOLERANCE mean absolute difference
+# (in 0-1 pixel units) of a full-resolution decode, see `draft_difference`.
+FAST_DECODE = os.getenv("FAST_DECODE", "1") != "0"
+DRAFT_OVERSAMPLE = 2
+DRAFT_TOLERANCE = 0.01
+
+
+def draft_decode(image: Image.Image, size: Tuple[int, int] = INPUT_SIZE) -> Image.Image:
+    """Ask the decoder for a reduced-resolution RGB version of an image.
+
+    Only has an effect on JPEG images that have not been loaded yet (Pillow
+    ignores the draft request otherwise); other images are returned
+    unchanged. The decoded size never drops below DRAFT_OVERSAMPLE times
+    `size`.
+
+    Args:
+        image: Lazily opened PIL Image
+        size: Final (height, width) the image will be resized to
+
+    Returns:
+        PIL Image, decoded at reduced resolution where possible
+    """
+    if image.format == 'JPEG':
+        height, width = size
+        image.draft('RGB', (width * DRAFT_OVERSAMPLE, height * DRAFT_OVERSAMPLE))
+    return image
+
+
+def draft_difference(image_data: bytes, size: Tuple[int, int] = INPUT_SIZE) -> float:
+    """Measure how far the fast decode path drifts from a full decode.
+
+    Args:
+        image_data: Encoded image bytes
+        size: Final (height, width)
+
+    Returns:
+        float: Mean absolute difference in 0-1 pixel units between the
+        resized full-resolution and draft-decoded images
+    """
+    full = Preprocessor(size, fast_decode=False).to_array(Image.open(io.BytesIO(image_data)))
+    fast = Preprocessor(size, fast_decode=True).to_array(Image.open(io.BytesIO(image_data)))
+    diff = np.abs(full.astype(np.float32) - fast.astype(np.float32))
+    return float(diff.mean() / 255.0)
+
+
+class Preprocessor:
+    """Resize and normalize images into model input tensors.
+
+    Preprocessing is split in two stages so batches can be normalized in one
+    vectorized pass:
+
+    * `to_array` decodes (with `draft_decode` for JPEGs), converts to RGB
+      and resizes a single image to a uint8 HWC array, matching
+      `transforms.Resize` on PIL images.
+    * `normalize` writes a batch of uint8 HWC arrays into one float32 NCHW
+      tensor. The dtype conversion and layout change happen in a single
+      copy and normalization is one in-place multiply-add, so no
+      intermediate float tensors are allocated. The result equals
+      `ToTensor()` followed by `Normalize(MEAN, STD)` up to float rounding.
+
+    Args:
+        size: Output (height, width)
+        fast_decode: Use reduced-resolution JPEG decoding
+    """
+    def __init__(self, size: Tuple[int, int] = INPUT_SIZE, fast_decode: bool = FAST_DECODE):
+        self.size = tuple(size)
+        self.fast_decode = fast_decode
+        # (x / 255 - mean) / std == x * scale + bias
+        std = torch.tensor(STD, dtype=torch.float32).view(1, 3, 1, 1)
+        mean = torch.tensor(MEAN, dtype=torch.float32).view(1, 3, 1, 1)
+        self._scale = 1.0 / (255.0 * std)
+        self._bias = -mean / std
+
+    @property
+    def version(self) -> str:
+        """Identify the settings that affect the arrays produced, e.g. for caching."""
+        height, width = self.size
+        decode = f"draft{DRAFT_OVERSAMPLE}" if self.fast_decode else "full"
+        return f"{height}x{width}-bilinear-{decode}"
+
+    def decode(self, image: Image.Image) -> Image.Image:
+        """Decode one image into RGB pixels (first half of `to_array`).
+
+        Args:
+            image: PIL Image, ideally not yet loaded
+
+        Returns:
+            PIL Image in RGB mode with its pixels loaded
+        """
+        if self.fast_decode:
+            image = draft_decode(image, self.size)
+        image.load()
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return image
+
+    def resize(self, image: Image.Image) -> np.ndarray:
+        """Resize a decoded RGB image into a uint8 array (second half of `to_array`).
+
+        Returns:
+            np.ndarray: uint8 array of shape (height, width, 3)
+        """
+        height, width = self.size
+        if image.size != (width, height):
+            image = image.resize((width, height), Image.BILINEAR)
+        return np.array(image, dtype=np.uint8)
+
+    def to_array(self, image: Image.Image) -> np.ndarray:
+        """Decode, convert and resize one image.
+
+        Args:
+            image: PIL Image, ideally not yet loaded
+
+        Returns:
+            np.ndarray: uint8 array of shape (height, width, 3)
+        """
+        return self.resize(self.decode(image))
+
+    def normalize(self, arrays: Union[np.ndarray, Sequence[np.ndarray]],
+                  out: torch.Tensor = None) -> torch.Tensor:
+        """Convert a batch of uint8 HWC arrays into a normalized tensor.
+
+        Args:
+            arrays: uint8 array of shape (N, H, W, 3) or a sequence of
+                (H, W, 3) arrays
+            out: Optional preallocated float32 tensor of shape (N, 3, H, W)
+
+        Returns:
+            Tensor of shape (N, 3, H, W)
+        """
+        count = len(arrays)
+        height, width = self.size
+        if out is None:
+            out = torch.empty((count, 3, height, width), dtype=torch.float32)
+
+        if isinstance(arrays, np.ndarray):
+            out.copy_(torch.from_numpy(arrays).permute(0, 3, 1, 2))
+        else:
+            for i, array in enumerate(arrays):
+                out[i].copy_(torch.from_numpy(np.asarray(array)).permute(2, 0, 1))
+
+        return torch.addcmul(self._bias, out, self._scale, out=out)
+
+    def __call__(self, image: Image.Image) -> torch.Tensor:
+        """Preprocess one image, as a drop-in for a torchvision transform.
+
+        Returns:
+            Tensor of shape (3, H, W)
+        """
+        return self.normalize([self.to_array(image)])[0]
+
+    def collate(self, samples: List[Tuple[np.ndarray, torch.Tensor]]) -> Tuple[torch.Tensor, torch.Tensor]:
+        """DataLoader `collate_fn` for datasets returning uint8 arrays.
+
+        Args:
+            samples: (uint8 HWC array, label tensor) pairs
+
+        Returns:
+            tuple: (normalized input batch, stacked labels)
+        """
+        arrays, labels = zip(*samples)
+        return self.normalize(arrays), torch.stack(labels)
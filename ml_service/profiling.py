@@ -0,0 +1,201 @@
+"""On-demand profiling of individual requests.
+
+A request is profiled when it carries ``X-Profile: <PROFILE_TOKEN>`` or when
+it is picked by sampling (PROFILE_SAMPLE_RATE, a fraction of requests).
+Requests that are not selected pay one header lookup and, with sampling
+enabled, one random number. Only one capture runs at a time; requests
+selected while another capture is running are served unprofiled.
+
+Two capture modes are supported:
+
+    cprofile  Python-level call graph, saved as a ``.prof`` pstats file
+              (open with ``python -m pstats`` or snakeviz)
+    torch     torch.profiler operator trace, saved as Chrome trace JSON
+              (open in chrome://tracing or Perfetto)
+
+The mode defaults to PROFILE_MODE and can be chosen per request with the
+``X-Profile-Mode`` header. Traces are written to PROFILE_DIR, which keeps at
+most PROFILE_MAX_TRACES files; the oldest are deleted first.
+
+Also used by the Flask backend (see backend/app/shared.py), where torch mode
+falls back to cProfile if torch is not installed.
+"""
+import cProfile
+import hmac
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_MODE_HEADER = "X-Profile-Mode"
+TRACE_HEADER = "X-Profile-Trace"
+PROFILE_MODES = ("cprofile", "torch")
+
+_EXTENSIONS = {"cprofile": ".prof", "torch": ".json"}
+_TRACE_NAME = re.compile(r"^[\w.-]+\.(prof|json)$")
+
+
+class RequestProfiler:
+    """Select requests for profiling and keep a bounded directory of traces.
+
+    Args:
+        trace_dir: Directory for trace files
+        token: Secret that enables profiling via the X-Profile header and
+            guards trace listing and download; None disables both
+        sample_rate: Fraction of requests profiled without the header
+        max_traces: Number of trace files kept
+        mode: Default capture mode, one of PROFILE_MODES
+    """
+    def __init__(self, trace_dir: str = "./profiles", token: Optional[str] = None,
+                 sample_rate: float = 0.0, max_traces: int = 50, mode: str = "cprofile"):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+        self.trace_dir = os.path.abspath(trace_dir)
+        self.token = token or None
+        self.sample_rate = sample_rate
+        self.max_traces = max_traces
+        self.mode = mode
+        self._capture_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RequestProfiler":
+        """Build a profiler from the PROFILE_* environment variables."""
+        return cls(
+            trace_dir=os.getenv("PROFILE_DIR", "./profiles"),
+            token=os.getenv("PROFILE_TOKEN"),
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+            max_traces=int(os.getenv("PROFILE_MAX_TRACES", "50")),
+            mode=os.getenv("PROFILE_MODE", "cprofile").lower(),
+        )
+
+    def authorized(self, token: Optional[str]) -> bool:
+        """Whether `token` matches the configured secret."""
+        if self.token is None or not token:
+            return False
+        return hmac.compare_digest(token.encode("utf-8"), self.token.encode("utf-8"))
+
+    def select(self, token: Optional[str] = None, mode: Optional[str] = None) -> Optional[str]:
+        """Decide whether to profile a request.
+
+        Args:
+            token: Value of the X-Profile header, if any
+            mode: Value of the X-Profile-Mode header, if any
+
+        Returns:
+            str: Capture mode to use, or None to serve the request normally
+        """
+        if token is not None and self.authorized(token):
+            mode = (mode or self.mode).lower()
+            return mode if mode in PROFILE_MODES else self.mode
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return self.mode
+        return None
+
+    def run(self, label: str, mode: str, fn: Callable, *args, **kwargs) -> Tuple[Any, Optional[str]]:
+        """Call `fn` under the profiler and save the trace.
+
+        Runs `fn` unprofiled if another capture is in progress. Errors
+        while saving are logged and do not fail the request.
+
+        Args:
+            label: Short name included in the trace file name
+            mode: Capture mode from `select`
+            fn: Function to profile, called with `args` and `kwargs`
+
+        Returns:
+            tuple: (result of `fn`, trace file name or None)
+        """
+        if not self._capture_lock.acquire(blocking=False):
+            return fn(*args, **kwargs), None
+        try:
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}_{label}_{uuid.uuid4().hex[:8]}{_EXTENSIONS[mode]}"
+            path = os.path.join(self.trace_dir, name)
+            if mode == "torch":
+                result, saved_path = self._run_torch(path, fn, args, kwargs)
+            else:
+                result, saved_path = self._run_cprofile(path, fn, args, kwargs)
+            if saved_path is None:
+                return result, None
+            self._prune()
+            return result, os.path.basename(saved_path)
+        finally:
+            self._capture_lock.release()
+
+    def _run_cprofile(self, path: str, fn, args, kwargs) -> Tuple[Any, Optional[str]]:
+        profiler = cProfile.Profile()
+        try:
+            result = profiler.runcall(fn, *args, **kwargs)
+        finally:
+            saved_path = self._save(path, profiler.dump_stats)
+        return result, saved_path
+
+    def _run_torch(self, path: str, fn, args, kwargs) -> Tuple[Any, Optional[str]]:
+        try:
+            import torch
+            from torch.profiler import ProfilerActivity, profile
+        except ImportError:
+            logging.warning("torch is not installed, falling back to cProfile")
+            return self._run_cprofile(os.path.splitext(path)[0] + _EXTENSIONS["cprofile"],
+                                      fn, args, kwargs)
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        with profile(activities=activities, record_shapes=True) as prof:
+            result = fn(*args, **kwargs)
+        return result, self._save(path, prof.export_chrome_trace)
+
+    def _save(self, path: str, write: Callable[[str], None]) -> Optional[str]:
+        """Write a trace to a temporary file and rename it into place.
+
+        Returns:
+            str: `path`, or None if the trace could not be written
+        """
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            write(tmp_path)
+            os.replace(tmp_path, path)
+            return path
+        except Exception as e:
+            logging.error(f"Error saving profile {path}: {str(e)}")
+            return None
+
+    def _prune(self):
+        """Delete the oldest traces beyond `max_traces`."""
+        traces = self.list_traces()
+        for trace in traces[self.max_traces:]:
+            try:
+                os.remove(os.path.join(self.trace_dir, trace["name"]))
+            except OSError:
+                pass
+
+    def list_traces(self) -> List[Dict[str, Any]]:
+        """Saved traces, newest first."""
+        if not os.path.isdir(self.trace_dir):
+            return []
+        traces = []
+        for entry in os.scandir(self.trace_dir):
+            if not entry.is_file() or not _TRACE_NAME.match(entry.name):
+                continue
+            stat = entry.stat()
+            traces.append({
+                "name": entry.name,
+                "mode": "torch" if entry.name.endswith(".json") else "cprofile",
+                "size": stat.st_size,
+                "created": stat.st_mtime,
+            })
+        traces.sort(key=lambda trace: trace["created"], reverse=True)
+        return traces
+
+    def trace_path(self, name: str) -> Optional[str]:
+        """Path of a saved trace, or None for unknown or unsafe names."""
+        if not _TRACE_NAME.match(name):
+            return None
+        path = os.path.join(self.trace_dir, name)
+        return path if os.path.isfile(path) else None
@@ -0,0 +1,251 @@
+"""Streaming dataset over sharded image archives, a manifest file or the
+backend's training-data store.
+
+Three sources are supported:
+
+* Tar shards in WebDataset style: members sharing a key (the path without
+  its extension) form one sample, e.g. ``000123.jpg`` plus ``000123.cls``
+  holding ``0`` (real) or ``1`` (fake). Without a ``.cls`` member the label
+  is taken from a ``real``/``fake`` directory in the key.
+* A manifest text file with one ``<path>\\t<label>`` line per image, where
+  the label is ``real``/``fake`` or ``0``/``1`` and relative paths are
+  resolved against the manifest's directory.
+* The backend's training database (SQLite) and content-addressed upload
+  store: every ``training_data`` row with a content hash, read from
+  ``<store>/ab/cd/<sha256>``.
+
+Nothing is listed up front, so memory use does not grow with corpus size.
+"""
+import io
+import os
+import random
+import sqlite3
+import tarfile
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+from PIL import Image
+
+from preprocessing import Preprocessor
+from distributed import get_rank, get_world_size
+from upload_paths import store_path
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+LABELS = {'real': 0, 'fake': 1, '0': 0, '1': 1}
+
+
+def _parse_label(value: str) -> int:
+    label = LABELS.get(value.strip().lower())
+    if label is None:
+        raise ValueError(f"Invalid label '{value}'. Must be real/fake or 0/1")
+    return label
+
+
+def _label_from_key(key: str) -> Optional[int]:
+    parts = key.replace('\\', '/').lower().split('/')
+    for name in ('real', 'fake'):
+        if name in parts[:-1]:
+            return LABELS[name]
+    return None
+
+
+def iter_training_rows(db_path: str) -> Iterator[Tuple[str, str]]:
+    """Stream (sha256, label) rows from the backend's training database."""
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        yield from conn.execute(
+            "SELECT sha256, label FROM training_data WHERE sha256 IS NOT NULL ORDER BY id"
+        )
+    finally:
+        conn.close()
+
+
+def in_train_split(key: str, train_split: float) -> bool:
+    """Deterministically assign a sample to the training split by its key."""
+    return zlib.crc32(key.encode('utf-8')) % 10000 < train_split * 10000
+
+
+def iter_tar_samples(shard_path: str) -> Iterator[Tuple[str, bytes, int]]:
+    """Stream (key, image bytes, label) samples from one tar shard.
+
+    The archive is read sequentially, so shards can live on slow or
+    streaming storage.
+    """
+    current_key, image_data, label = None, None, None
+
+    def finished():
+        if current_key is None or image_data is None:
+            return None
+        sample_label = label if label is not None else _label_from_key(current_key)
+        if sample_label is None:
+            return None
+        return current_key, image_data, sample_label
+
+    with tarfile.open(shard_path, mode='r|*') as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            key, ext = os.path.splitext(member.name)
+            if key != current_key:
+                sample = finished()
+                if sample is not None:
+                    yield sample
+                current_key, image_data, label = key, None, None
+            ext = ext.lower()
+            if ext in IMAGE_EXTENSIONS:
+                image_data = archive.extractfile(member).read()
+            elif ext == '.cls':
+                label = _parse_label(archive.extractfile(member).read().decode('utf-8'))
+
+    sample = finished()
+    if sample is not None:
+        yield sample
+
+
+def write_shards(samples: List[Tuple[str, int]], output_pattern: str,
+                 samples_per_shard: int = 10000) -> List[str]:
+    """Pack (image path, label) samples into tar shards.
+
+    Args:
+        samples: Image paths with labels (0 real, 1 fake)
+        output_pattern: Shard path with a format field, e.g.
+            ``shards/train-{:06d}.tar``
+        samples_per_shard: Samples written to each shard
+
+    Returns:
+        list: Paths of the written shards
+    """
+    shard_paths = []
+    archive = None
+    for index, (path, label) in enumerate(samples):
+        if index % samples_per_shard == 0:
+            if archive is not None:
+                archive.close()
+            shard_paths.append(output_pattern.format(len(shard_paths)))
+            archive = tarfile.open(shard_paths[-1], mode='w')
+        key = f"{index:09d}"
+        ext = os.path.splitext(path)[1].lower()
+        archive.add(path, arcname=key + ext)
+        label_bytes = str(label).encode('utf-8')
+        info = tarfile.TarInfo(key + '.cls')
+        info.size = len(label_bytes)
+        archive.addfile(info, io.BytesIO(label_bytes))
+    if archive is not None:
+        archive.close()
+    return shard_paths
+
+
+class ShardedImageDataset(IterableDataset):
+    """Iterable dataset streaming labelled images from shards, a manifest or
+    the backend's training database.
+
+    Shards (or, for a manifest, lines) are split deterministically across
+    distributed ranks and DataLoader workers so every sample is read
+    exactly once per epoch.
+    With `shuffle_buffer` > 0 the shard order is reshuffled each epoch and
+    samples pass through a reservoir of that size, seeded by `seed` and the
+    epoch set with `set_epoch`.
+
+    Args:
+        shards: Tar shard paths
+        manifest: Manifest file path (used when no shards are given)
+        training_db: Backend SQLite database (used when neither shards nor
+            a manifest are given)
+        upload_store: Backend upload store directory holding the images
+            listed in `training_db`
+        image_size: Side length images are resized to
+        raw: Yield uint8 arrays for `Preprocessor.collate` instead of
+            normalized tensors
+        shuffle_buffer: Number of samples held for shuffling (0 disables)
+        seed: Base random seed
+        split: 'train', 'val' or None for all samples
+        train_split: Fraction of samples assigned to 'train' by key hash
+    """
+    def __init__(self, shards: Optional[List[str]] = None, manifest: Optional[str] = None,
+                 training_db: Optional[str] = None, upload_store: Optional[str] = None,
+                 image_size: int = 224, raw: bool = True, shuffle_buffer: int = 0,
+                 seed: int = 0, split: Optional[str] = None, train_split: float = 0.8):
+        if not shards and not manifest and not training_db:
+            raise ValueError("One of shards, manifest or training_db must be provided")
+        if training_db and not upload_store:
+            raise ValueError("training_db requires upload_store")
+        self.shards = sorted(shards or [])
+        self.manifest = manifest
+        self.training_db = training_db
+        self.upload_store = upload_store
+        self.preprocessor = Preprocessor((image_size, image_size))
+        self.raw = raw
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.split = split
+        self.train_split = train_split
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        """Change the shuffle order for the next pass."""
+        self.epoch = epoch
+
+    def _partition(self) -> Tuple[int, int]:
+        """Return (index, count) of this reader among all readers."""
+        worker = get_worker_info()
+        worker_id, num_workers = (0, 1) if worker is None else (worker.id, worker.num_workers)
+        return get_rank() * num_workers + worker_id, get_world_size() * num_workers
+
+    def _encoded_samples(self, rng: random.Random) -> Iterator[Tuple[str, bytes, int]]:
+        index, count = self._partition()
+        if self.shards:
+            shards = list(self.shards)
+            if self.shuffle_buffer:
+                rng.shuffle(shards)
+            for shard_path in shards[index::count]:
+                yield from iter_tar_samples(shard_path)
+            return
+
+        if not self.manifest:
+            # Hash keys keep the train/val split stable as rows are added
+            for row_number, (sha256, label) in enumerate(iter_training_rows(self.training_db)):
+                if row_number % count != index:
+                    continue
+                with open(store_path(self.upload_store, sha256), 'rb') as image_file:
+                    yield sha256, image_file.read(), _parse_label(label)
+            return
+
+        base_dir = os.path.dirname(os.path.abspath(self.manifest))
+        with open(self.manifest) as f:
+            for line_number, line in enumerate(f):
+                if line_number % count != index or not line.strip():
+                    continue
+                path, label = line.rstrip('\n').rsplit('\t', 1)
+                full_path = path if os.path.isabs(path) else os.path.join(base_dir, path)
+                with open(full_path, 'rb') as image_file:
+                    yield path, image_file.read(), _parse_label(label)
+
+    def _decode(self, image_data: bytes):
+        array = self.preprocessor.to_array(Image.open(io.BytesIO(image_data)))
+        return array if self.raw else self.preprocessor.normalize([array])[0]
+
+    def __iter__(self):
+        # Same seed in every worker so the shard shuffle is identical, but a
+        # per-worker seed for the sample buffer
+        shard_rng = random.Random(self.seed + self.epoch)
+        index, _ = self._partition()
+        rng = random.Random((self.seed + self.epoch) * 1000003 + index)
+        buffer = []
+        for key, image_data, label in self._encoded_samples(shard_rng):
+            if self.split is not None and in_train_split(key, self.train_split) != (self.split == 'train'):
+                continue
+            sample = (self._decode(image_data), torch.tensor([label], dtype=torch.float32))
+            if self.shuffle_buffer <= 0:
+                yield sample
+                continue
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(sample)
+                continue
+            slot = rng.randrange(len(buffer))
+            yield buffer[slot]
+            buffer[slot] = sample
+
+        rng.shuffle(buffer)
+        yield from buffer
@@ -0,0 +1,89 @@
+"""The fast JPEG decode path must stay within DRAFT_TOLERANCE of a full decode."""
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from preprocessing import DRAFT_OVERSAMPLE, DRAFT_TOLERANCE, INPUT_SIZE, draft_decode, draft_difference
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(SERVICE_DIR)
+
+
+def _photo(size, seed=0):
+    """Smooth gradients, hard-edged shapes and sensor-like noise."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        127 + 100 * np.sin(x / (width / 5.0)),
+        127 + 100 * np.cos(y / (height / 3.0)),
+        127 + 100 * np.sin((x + y) / (width / 7.0)),
+    ], axis=-1)
+    base += rng.normal(0, 12, size=base.shape)
+    image = Image.fromarray(np.clip(base, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x0, y0 = rng.integers(0, width), rng.integers(0, height)
+        x1, y1 = x0 + rng.integers(10, width // 4), y0 + rng.integers(10, height // 4)
+        draw.rectangle([x0, y0, x1, y1], fill=tuple(int(c) for c in rng.integers(0, 256, 3)))
+        draw.line([x0, y1, x1, y0], fill=(255, 255, 255), width=int(rng.integers(1, 6)))
+    return image.filter(ImageFilter.GaussianBlur(0.6))
+
+
+def _jpeg(image, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', **params)
+    return buffer.getvalue()
+
+
+def _repo_sample(name, scale):
+    with Image.open(name) as image:
+        image = image.convert('RGB')
+        return _jpeg(image.resize((image.width * scale, image.height * scale), Image.BICUBIC),
+                     quality=90)
+
+
+SAMPLES = {
+    'photo_1600x1200': lambda: _jpeg(_photo((1600, 1200)), quality=90),
+    'photo_3000x2000_q75': lambda: _jpeg(_photo((3000, 2000), seed=1), quality=75),
+    'photo_4000x3000_q95': lambda: _jpeg(_photo((4000, 3000), seed=2), quality=95),
+    'portrait_1200x2400': lambda: _jpeg(_photo((1200, 2400), seed=3), quality=85),
+    'no_subsampling': lambda: _jpeg(_photo((2000, 1500), seed=4), quality=90, subsampling=0),
+    'progressive': lambda: _jpeg(_photo((2400, 1800), seed=5), quality=85, progressive=True),
+    'grayscale': lambda: _jpeg(_photo((2400, 1800), seed=6).convert('L'), quality=90),
+    'cmyk': lambda: _jpeg(_photo((2400, 1800), seed=7).convert('CMYK'), quality=90),
+    'sample_x3': lambda: _repo_sample(os.path.join(REPO_DIR, 'test_images', 'sample.jpg'), 3),
+    'test_image_x20': lambda: _repo_sample(os.path.join(SERVICE_DIR, 'test_images', 'test_image.jpg'), 20),
+}
+
+
+@pytest.mark.parametrize('name', sorted(SAMPLES))
+def test_draft_within_tolerance(name):
+    image_data = SAMPLES[name]()
+    # The sample must be large enough for the decoder to scale it down
+    image = draft_decode(Image.open(io.BytesIO(image_data)))
+    height, width = INPUT_SIZE
+    assert image.size[0] >= width * DRAFT_OVERSAMPLE and image.size[1] >= height * DRAFT_OVERSAMPLE
+    with Image.open(io.BytesIO(image_data)) as full:
+        assert image.size[0] < full.size[0]
+
+    assert draft_difference(image_data) <= DRAFT_TOLERANCE
+
+
+@pytest.mark.parametrize('path', [
+    os.path.join(REPO_DIR, 'test_images', 'sample.jpg'),
+    os.path.join(SERVICE_DIR, 'test_images', 'test_image.jpg'),
+])
+def test_small_images_are_decoded_in_full(path):
+    # Below DRAFT_OVERSAMPLE x the input size there is nothing to skip
+    with open(path, 'rb') as f:
+        assert draft_difference(f.read()) == 0.0
+
+
+def test_png_is_unchanged():
+    buffer = io.BytesIO()
+    _photo((1600, 1200)).save(buffer, format='PNG')
+    assert draft_difference(buffer.getvalue()) == 0.0
@@ -0,0 +1,62 @@
+"""A dead inference worker must be replaced and the pool keep serving."""
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+import torch.multiprocessing as mp
+
+from model import ImageClassifier
+from worker_pool import InferencePool
+
+
+def _batch(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, size=(count, 224, 224, 3), dtype=np.uint8)
+
+
+@pytest.fixture
+def classifier(tmp_path):
+    # Random weights; the pool must serve the same ones after a restart
+    return ImageClassifier(model_path=str(tmp_path / 'missing.pt'), model_format='state_dict')
+
+
+@pytest.fixture
+def pool(classifier):
+    pool = InferencePool(classifier, num_workers=2, cores_per_worker=1, timeout=60)
+    yield pool
+    pool.close()
+
+
+def _wait_for_restart(pool, restarts, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = pool.stats()
+        if stats['restarts'] >= restarts and stats['alive'] == pool.num_workers:
+            return
+        time.sleep(0.1)
+    pytest.fail(f'Worker was not replaced: {pool.stats()}')
+
+
+def test_serves_batches(pool, classifier):
+    batch = _batch(4)
+    assert pool.predict_arrays(batch) == classifier.predict_arrays(batch)
+
+
+def test_killed_worker_is_replaced(pool, classifier):
+    batch = _batch(3, seed=1)
+    expected = classifier.predict_arrays(batch)
+    assert pool.predict_arrays(batch) == expected
+
+    victim = pool._workers[0]
+    os.kill(victim.process.pid, signal.SIGKILL)
+    _wait_for_restart(pool, 1)
+
+    replacement = pool._workers[0]
+    assert replacement is not victim
+    assert isinstance(replacement.process, mp.get_context('spawn').Process)
+    # Idle workers are picked in order, so these go to the replacement
+    for _ in range(2 * pool.num_workers):
+        assert pool.predict_arrays(batch) == expected
+    assert pool.stats()['restarts'] == 1
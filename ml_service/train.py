@@ -1,10 +1,15 @@
 """Training script for fake news image detection model."""
 import os
+import glob
 import argparse
 from datetime import datetime
 
-from model import ImageClassifier
+import torch
+
+from model import ImageClassifier, MODEL_REGISTRY
 from data_loader import get_data_loaders
+from checkpoint import latest_checkpoint, load_checkpoint, start_run
+from distributed import cleanup, init_distributed, is_main_process
 
 def train_model(args):
     """Train the fake news detection model.
@@ -12,8 +17,15 @@ def train_model(args):
     Args:
         args: Command line arguments
     """
+    if args.distributed:
+        init_distributed(args.backend)
+    if args.num_threads:
+        torch.set_num_threads(args.num_threads)
+    main_process = is_main_process()
+    
     # Create model directory if it doesn't exist
-    os.makedirs(args.model_dir, exist_ok=True)
+    if main_process:
+        os.makedirs(args.model_dir, exist_ok=True)
     
     # Generate model save path
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -22,23 +34,88 @@ def train_model(args):
         f"fake_detector_{timestamp}.pt"
     )
     
+    # Architecture settings; the checkpoint records them for serving
+    arch = args.arch
+    model_config = {"input_size": args.image_size}
+    if args.width is not None:
+        model_config["width"] = args.width
+    
+    # Full training checkpoints, one per epoch, in a directory per run
+    checkpoint_root = args.checkpoint_dir or os.path.join(args.model_dir, "checkpoints")
+    checkpoint_dir = os.path.join(checkpoint_root, f"run_{timestamp}")
+    resume_from = None
+    if args.resume:
+        resume_path = latest_checkpoint(checkpoint_root) if args.resume == "latest" else args.resume
+        if not resume_path or not os.path.exists(resume_path):
+            raise FileNotFoundError(f"No checkpoint to resume from in {checkpoint_root}")
+        # A resumed run keeps writing to its own directory
+        checkpoint_dir = os.path.dirname(os.path.abspath(resume_path))
+        if main_process:
+            print(f"Resuming from checkpoint: {resume_path}")
+        resume_from = load_checkpoint(resume_path)
+        arch = resume_from["model"]["arch"]
+        model_config = resume_from["model"]["config"]
+        model_path = resume_from.get("save_path") or model_path
+    elif main_process:
+        start_run(checkpoint_root, os.path.basename(checkpoint_dir))
+    
+    # Initialize the model (continuing from MODEL_PATH if it exists)
+    model = ImageClassifier(
+        model_format="state_dict",
+        arch=arch,
+        model_config=model_config,
+        pretrained=not (args.from_scratch or resume_from)
+    )
+    # A checkpoint at MODEL_PATH decides the architecture; training it with
+    # data prepared for different settings would fail or silently mislead
+    if not resume_from:
+        mismatched = [
+            f"{name}={model.model_config[name]} (requested {value})"
+            for name, value in model_config.items()
+            if name in model.model_config and model.model_config[name] != value
+        ]
+        if model.arch != arch:
+            mismatched.insert(0, f"arch={model.arch} (requested {arch})")
+        if mismatched:
+            raise ValueError(
+                f"The existing model at MODEL_PATH has {', '.join(mismatched)}; "
+                "pass matching settings or --from_scratch"
+            )
+    
+    # Expand shard patterns
+    shards = sorted(path for pattern in args.shards or [] for path in glob.glob(pattern))
+    
     # Get data loaders
     train_loader, val_loader = get_data_loaders(
         args.data_dir,
         batch_size=args.batch_size,
-        train_split=args.train_split
+        train_split=args.train_split,
+        image_size=model.input_size,
+        cache_dir=args.cache_dir,
+        shards=shards,
+        manifest=args.manifest,
+        training_db=args.training_db,
+        upload_store=args.upload_store,
+        shuffle_buffer=args.shuffle_buffer
     )
     
-    # Initialize and train model
-    model = ImageClassifier()
-    history = model.train(
-        train_loader,
-        val_loader=val_loader,
-        epochs=args.epochs,
-        save_path=model_path
-    )
+    try:
+        history = model.train(
+            train_loader,
+            val_loader=val_loader,
+            epochs=args.epochs,
+            save_path=model_path,
+            bf16=args.bf16,
+            channels_last=args.channels_last,
+            compile=args.compile,
+            checkpoint_dir=checkpoint_dir,
+            resume_from=resume_from
+        )
+    finally:
+        cleanup()
     
-    print(f"\nTraining completed. Best model saved to: {model_path}")
+    if main_process:
+        print(f"\nTraining completed. Best model saved to: {model_path}")
     return history
 
 def main():
@@ -46,15 +123,60 @@ def main():
     parser.add_argument(
         "--data_dir",
         type=str,
-        required=True,
+        default=None,
         help="Directory containing 'real' and 'fake' image subdirectories"
     )
+    parser.add_argument(
+        "--shards",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Tar shard paths or glob patterns to stream instead of --data_dir"
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="Manifest file of '<path>\\t<label>' lines to stream instead of --data_dir"
+    )
+    parser.add_argument(
+        "--training_db",
+        type=str,
+        default=None,
+        help="Backend SQLite database whose training_data rows to stream instead of --data_dir"
+    )
+    parser.add_argument(
+        "--upload_store",
+        type=str,
+        default=None,
+        help="Backend upload store directory holding the images in --training_db"
+    )
+    parser.add_argument(
+        "--shuffle_buffer",
+        type=int,
+        default=1000,
+        help="Samples held for shuffling when streaming"
+    )
     parser.add_argument(
         "--model_dir",
         type=str,
         default="./models",
         help="Directory to save trained models"
     )
+    parser.add_argument(
+        "--checkpoint_dir",
+        type=str,
+        default=None,
+        help="Directory holding a checkpoint directory per run (default: <model_dir>/checkpoints)"
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        nargs="?",
+        const="latest",
+        default=None,
+        help="Resume from a checkpoint path, or the latest one of the most recent run in --checkpoint_dir if no path is given"
+    )
     parser.add_argument(
         "--batch_size",
         type=int,
@@ -67,6 +189,68 @@ def main():
         default=10,
         help="Number of training epochs"
     )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="Directory for a memory-mapped cache of decoded images, reused across epochs and runs"
+    )
+    parser.add_argument(
+        "--arch",
+        type=str,
+        default="simple_cnn",
+        choices=sorted(MODEL_REGISTRY),
+        help="Model architecture"
+    )
+    parser.add_argument(
+        "--image_size",
+        type=int,
+        default=224,
+        help="Input resolution (side length) to train at"
+    )
+    parser.add_argument(
+        "--width",
+        type=int,
+        default=None,
+        help="Base channel width (pooled_cnn only)"
+    )
+    parser.add_argument(
+        "--from_scratch",
+        action="store_true",
+        help="Ignore existing weights at MODEL_PATH and start from random initialization"
+    )
+    parser.add_argument(
+        "--bf16",
+        action="store_true",
+        help="Train with bfloat16 autocast (fast on CPUs with AVX512-BF16/AMX)"
+    )
+    parser.add_argument(
+        "--channels_last",
+        action="store_true",
+        help="Use channels_last memory format for convolutions"
+    )
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        help="Compile the model with torch.compile"
+    )
+    parser.add_argument(
+        "--num_threads",
+        type=int,
+        default=None,
+        help="Torch intra-op threads (defaults to all cores)"
+    )
+    parser.add_argument(
+        "--distributed",
+        action="store_true",
+        help="Data-parallel training across the processes started by torchrun"
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="gloo",
+        help="torch.distributed backend (gloo for CPUs, nccl for GPUs)"
+    )
     parser.add_argument(
         "--train_split",
         type=float,
@@ -75,6 +259,14 @@ def main():
     )
     
     args = parser.parse_args()
+    if not (args.data_dir or args.shards or args.manifest or args.training_db):
+        parser.error("one of --data_dir, --shards, --manifest or --training_db is required")
+    if args.training_db and not args.upload_store:
+        parser.error("--training_db requires --upload_store")
+    if args.shards:
+        unmatched = [pattern for pattern in args.shards if not glob.glob(pattern)]
+        if unmatched:
+            parser.error(f"--shards matched no files: {' '.join(unmatched)}")
     train_model(args)
 
 if __name__ == "__main__":
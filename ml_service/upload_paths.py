@@ -0,0 +1,12 @@
+"""Layout of the backend's content-addressed upload store.
+
+The backend writes uploads to the store and the ML service reads them when
+training from the backend's database; both take paths from here (the
+backend through backend/app/shared.py).
+"""
+import os
+
+
+def store_path(root_dir: str, sha256: str) -> str:
+    """Path of the file with content hash `sha256` under `root_dir`."""
+    return os.path.join(root_dir, sha256[:2], sha256[2:4], sha256)
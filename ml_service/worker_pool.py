@@ -0,0 +1,280 @@
+"""Multi-process inference pool sharing one copy of the model weights."""
+import functools
+import itertools
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from multiprocessing.connection import wait
+from typing import List, Optional
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from model import ImageClassifier
+
+
+def _core_slices(num_workers: int, cores_per_worker: Optional[int]) -> List[List[int]]:
+    """Split the CPUs this process may use into one slice per worker."""
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    per_worker = cores_per_worker or max(1, len(cores) // num_workers)
+    slices = []
+    for i in range(num_workers):
+        start = (i * per_worker) % len(cores)
+        slices.append([cores[(start + j) % len(cores)] for j in range(per_worker)])
+    return slices
+
+
+def _worker_main(classifier, cores: List[int], conn):
+    """Inference process loop: pin to `cores`, then serve batches until told to stop.
+
+    `classifier` is an ImageClassifier, or a function that loads one in
+    this process.
+    """
+    if not hasattr(classifier, "predict_arrays"):
+        classifier = classifier()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+    torch.set_num_interop_threads(1)
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        job_id, arrays = job
+        try:
+            conn.send((job_id, classifier.predict_arrays(arrays), None))
+        except Exception as e:
+            conn.send((job_id, None, f"{type(e).__name__}: {str(e)}"))
+
+
+class _Worker:
+    """One inference process, its pipe and the batches sent to it."""
+    def __init__(self, context, classifier, cores: List[int]):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(classifier, cores, child_conn),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.cores = cores
+        self.in_flight = {}
+        self.send_lock = threading.Lock()
+
+
+class InferencePool:
+    """Fixed pool of inference processes, each fed over its own pipe.
+
+    The classifier's weights are moved to shared memory once in the parent
+    and inherited by every worker, so memory stays bounded as workers are
+    added. Each worker is pinned to its own slice of cores and sets torch's
+    intra-op thread count to match, so workers don't compete for cores.
+    Requests carry uint8 image batches from `Preprocessor.to_array`, which
+    are much smaller to pickle than float tensors.
+
+    Batches go to the worker with the fewest outstanding. A worker that
+    exits (e.g. killed for memory) fails its outstanding batches and is
+    replaced; no lock is shared between workers, so one dying cannot block
+    the others.
+
+    The initial workers are forked (where available) before the server
+    starts its threads. Replacements are started from the collector thread
+    while request threads are running, where a forked child could inherit
+    locks held by other threads, so they are spawned instead: state_dict
+    models are sent as the shared-memory weights, other formats are loaded
+    again from the classifier's model path.
+
+    Args:
+        classifier: Loaded ImageClassifier to serve
+        num_workers: Number of inference processes
+        cores_per_worker: CPUs pinned to each worker; defaults to an even
+            split of the available CPUs
+        timeout: Seconds `predict_arrays` waits for a batch
+    """
+    def __init__(self, classifier, num_workers: int = 2, cores_per_worker: Optional[int] = None,
+                 timeout: float = 30.0):
+        self.num_workers = max(1, num_workers)
+        self.core_slices = _core_slices(self.num_workers, cores_per_worker)
+        self.timeout = timeout
+
+        classifier.model.share_memory()
+        methods = mp.get_all_start_methods()
+        self._context = mp.get_context("fork" if "fork" in methods else "spawn")
+        self._respawn_context = mp.get_context("spawn")
+        if classifier.model_format == "state_dict":
+            self._respawn_source = classifier
+        else:
+            # Quantized and TorchScript models can't be sent to a spawned process
+            self._respawn_source = functools.partial(
+                ImageClassifier, model_path=classifier.model_path,
+                model_format=classifier.model_format, arch=classifier.arch,
+                model_config=classifier.model_config
+            )
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._closed = False
+        self.restarts = 0
+        self._workers = [_Worker(self._context, classifier, cores) for cores in self.core_slices]
+
+        self._collector = threading.Thread(target=self._collect, name="inference-pool", daemon=True)
+        self._collector.start()
+        logging.info(f"Started {self.num_workers} inference workers on cores {self.core_slices}")
+
+    @classmethod
+    def from_env(cls, classifier) -> "InferencePool":
+        """Build a pool configured from INFERENCE_WORKERS / INFERENCE_THREADS / INFERENCE_TIMEOUT."""
+        threads = os.getenv("INFERENCE_THREADS")
+        return cls(
+            classifier,
+            num_workers=int(os.getenv("INFERENCE_WORKERS", "2")),
+            cores_per_worker=int(threads) if threads else None,
+            timeout=float(os.getenv("INFERENCE_TIMEOUT", "30")),
+        )
+
+    def _deliver(self, worker: _Worker, message):
+        job_id, predictions, error = message
+        with self._lock:
+            future = worker.in_flight.pop(job_id, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(f"Inference worker failed: {error}"))
+        else:
+            future.set_result(predictions)
+
+    def _replace(self, worker: _Worker):
+        """Fail a dead worker's batches and start a new process in its place."""
+        worker.process.join(timeout=1)
+        # Deliver whatever it finished before exiting
+        try:
+            while worker.conn.poll():
+                self._deliver(worker, worker.conn.recv())
+        except (EOFError, OSError):
+            pass
+        worker.conn.close()
+
+        with self._lock:
+            if worker not in self._workers:
+                return
+            in_flight, worker.in_flight = worker.in_flight, {}
+            if not self._closed:
+                self._workers[self._workers.index(worker)] = _Worker(
+                    self._respawn_context, self._respawn_source, worker.cores
+                )
+                self.restarts += 1
+            else:
+                self._workers.remove(worker)
+        if not self._closed:
+            logging.error(f"Inference worker {worker.process.pid} exited with code "
+                          f"{worker.process.exitcode}; failed {len(in_flight)} batches")
+        for future in in_flight.values():
+            if not future.done():
+                future.set_exception(RuntimeError("Inference worker exited"))
+
+    def _collect(self):
+        """Route results back to waiting callers and replace dead workers."""
+        while True:
+            with self._lock:
+                if self._closed and not self._workers:
+                    break
+                by_conn = {worker.conn: worker for worker in self._workers}
+                by_sentinel = {worker.process.sentinel: worker for worker in self._workers}
+            for ready in wait(list(by_conn) + list(by_sentinel), timeout=1.0):
+                if ready in by_sentinel:
+                    self._replace(by_sentinel[ready])
+                    continue
+                worker = by_conn[ready]
+                try:
+                    message = worker.conn.recv()
+                except (EOFError, OSError):
+                    self._replace(worker)
+                    continue
+                self._deliver(worker, message)
+            if self._closed:
+                with self._lock:
+                    done = [worker for worker in self._workers if not worker.process.is_alive()]
+                for worker in done:
+                    self._replace(worker)
+
+    def submit(self, arrays) -> Future:
+        """Send a batch of uint8 images to the least busy worker.
+
+        Args:
+            arrays: uint8 array of shape (N, H, W, 3) or a sequence of
+                (H, W, 3) arrays
+
+        Returns:
+            Future resolving to a list of (prediction, confidence) tuples
+        """
+        future = Future()
+        job_id = next(self._ids)
+        batch = np.ascontiguousarray(np.stack(arrays))
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Inference pool closed")
+            worker = min(self._workers, key=lambda worker: len(worker.in_flight))
+            worker.in_flight[job_id] = future
+        try:
+            with worker.send_lock:
+                worker.conn.send((job_id, batch))
+        except (OSError, ValueError) as e:
+            # The collector replaces the worker once its exit is seen
+            with self._lock:
+                worker.in_flight.pop(job_id, None)
+            future.set_exception(RuntimeError(f"Inference worker unavailable: {e}"))
+        return future
+
+    def predict_arrays(self, arrays) -> list:
+        """Blocking equivalent of `ImageClassifier.predict_arrays`.
+
+        Raises:
+            TimeoutError: If no result arrives within `timeout` seconds
+        """
+        future = self.submit(arrays)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Inference took longer than {self.timeout}s")
+
+    def stats(self) -> dict:
+        """Return pool layout and liveness."""
+        with self._lock:
+            workers = list(self._workers)
+            pending = sum(len(worker.in_flight) for worker in workers)
+        return {
+            "workers": self.num_workers,
+            "core_slices": self.core_slices,
+            "alive": sum(1 for worker in workers if worker.process.is_alive()),
+            "restarts": self.restarts,
+            "pending_batches": pending,
+        }
+
+    def close(self):
+        """Stop the workers and the result collector."""
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+        for worker in workers:
+            try:
+                with worker.send_lock:
+                    worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._collector.join(timeout=5)